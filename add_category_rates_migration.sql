@@ -0,0 +1,40 @@
+-- Migration to add the category rate history
+-- Run this in your Supabase SQL editor
+
+-- The rate of each category from valid_from until the next entry
+CREATE TABLE IF NOT EXISTS category_rates (
+    category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
+    rate DECIMAL(10,2) NOT NULL,
+    valid_from DATE NOT NULL DEFAULT CURRENT_DATE,
+    PRIMARY KEY (category_id, valid_from)
+);
+
+ALTER TABLE category_rates ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Anyone can view category rates" ON category_rates;
+CREATE POLICY "Anyone can view category rates" ON category_rates
+    FOR SELECT USING (true);
+
+-- Record every rate change; a change made on the same day replaces that
+-- day's entry
+CREATE OR REPLACE FUNCTION record_category_rate()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.rate IS DISTINCT FROM OLD.rate THEN
+        INSERT INTO category_rates (category_id, rate, valid_from)
+        VALUES (NEW.id, NEW.rate, CURRENT_DATE)
+        ON CONFLICT (category_id, valid_from) DO UPDATE SET rate = EXCLUDED.rate;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS record_categories_rate ON categories;
+CREATE TRIGGER record_categories_rate AFTER INSERT OR UPDATE OF rate ON categories
+    FOR EACH ROW EXECUTE FUNCTION record_category_rate();
+
+-- Start the history of existing categories at their current rate
+INSERT INTO category_rates (category_id, rate, valid_from)
+SELECT id, rate, COALESCE(created_at::DATE, CURRENT_DATE)
+FROM categories
+ON CONFLICT (category_id, valid_from) DO NOTHING;
@@ -0,0 +1,6 @@
+-- Migration to add the client_id idempotency key to the logs table
+-- Run this in your Supabase SQL editor
+
+-- Inserts retried from the app's write queue carry the same client_id, so a
+-- retry after a lost response does not create a duplicate log
+ALTER TABLE logs ADD COLUMN IF NOT EXISTS client_id UUID UNIQUE;
@@ -0,0 +1,83 @@
+-- Migration to add the daily rollups the dashboard charts read
+-- Run this in your Supabase SQL editor
+
+-- One row per user, day and category, kept in sync with logs by the trigger
+-- below so charts read day buckets, not rows
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
+    hours DECIMAL(12,2) NOT NULL DEFAULT 0,
+    value DECIMAL(14,2) NOT NULL DEFAULT 0,
+    n_logs INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date, category_id)
+);
+
+ALTER TABLE daily_rollups ENABLE ROW LEVEL SECURITY;
+
+-- Rollups are only written by the trigger on logs
+DROP POLICY IF EXISTS "Users can view their own daily rollups" ON daily_rollups;
+CREATE POLICY "Users can view their own daily rollups" ON daily_rollups
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- Add a (possibly negative) delta to one daily rollup bucket
+CREATE OR REPLACE FUNCTION apply_daily_rollup(
+    p_user_id UUID,
+    p_date DATE,
+    p_category_id INTEGER,
+    p_hours DECIMAL,
+    p_value DECIMAL,
+    p_n_logs INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+    IF p_user_id IS NULL OR p_category_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO daily_rollups (user_id, date, category_id, hours, value, n_logs)
+    VALUES (p_user_id, p_date, p_category_id, p_hours, p_value, p_n_logs)
+    ON CONFLICT (user_id, date, category_id) DO UPDATE SET
+        hours = daily_rollups.hours + EXCLUDED.hours,
+        value = daily_rollups.value + EXCLUDED.value,
+        n_logs = daily_rollups.n_logs + EXCLUDED.n_logs;
+
+    -- Drop buckets whose last log was removed or moved away
+    DELETE FROM daily_rollups
+    WHERE user_id = p_user_id AND date = p_date AND category_id = p_category_id AND n_logs <= 0;
+END;
+$$ language 'plpgsql';
+
+-- Keep daily_rollups in sync with logs. Runs as the table owner because
+-- users only have SELECT access to daily_rollups.
+CREATE OR REPLACE FUNCTION update_daily_rollups()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_daily_rollup(OLD.user_id, OLD.date, OLD.category_id, -OLD.hours, -OLD.value, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_daily_rollup(NEW.user_id, NEW.date, NEW.category_id, NEW.hours, NEW.value, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+-- Install the trigger and rebuild the rollups in one transaction, with
+-- writes to logs blocked, so no log is counted twice or missed
+BEGIN;
+
+LOCK TABLE logs IN SHARE MODE;
+
+DROP TRIGGER IF EXISTS update_logs_daily_rollups ON logs;
+CREATE TRIGGER update_logs_daily_rollups AFTER INSERT OR UPDATE OR DELETE ON logs
+    FOR EACH ROW EXECUTE FUNCTION update_daily_rollups();
+
+DELETE FROM daily_rollups;
+INSERT INTO daily_rollups (user_id, date, category_id, hours, value, n_logs)
+SELECT user_id, date, category_id, SUM(hours), SUM(value), COUNT(*)
+FROM logs
+WHERE user_id IS NOT NULL AND category_id IS NOT NULL
+GROUP BY user_id, date, category_id;
+
+COMMIT;
@@ -0,0 +1,29 @@
+-- Migration to add the per-category log summary the dashboard totals read
+-- Run this in your Supabase SQL editor
+
+-- Dashboard aggregates: one row per category the user has logged.
+-- Runs with the caller's privileges, so the logs RLS policies still apply.
+CREATE OR REPLACE FUNCTION get_user_log_summary(p_user_id UUID)
+RETURNS TABLE (
+    category_id INTEGER,
+    category_name VARCHAR(100),
+    total_hours DECIMAL(12,2),
+    total_value DECIMAL(14,2),
+    n_logs BIGINT,
+    first_date DATE,
+    last_date DATE
+) AS $$
+    SELECT
+        l.category_id,
+        c.name,
+        SUM(l.hours),
+        SUM(l.value),
+        COUNT(*),
+        MIN(l.date),
+        MAX(l.date)
+    FROM logs l
+    LEFT JOIN categories c ON c.id = l.category_id
+    WHERE l.user_id = p_user_id
+    GROUP BY l.category_id, c.name
+    ORDER BY c.name;
+$$ language 'sql' STABLE;
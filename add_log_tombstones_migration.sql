@@ -0,0 +1,41 @@
+-- Migration to add incremental log sync
+-- Run this in your Supabase SQL editor
+
+-- Deleted log ids, so clients syncing by logs.updated_at can drop them from
+-- their local copies
+CREATE TABLE IF NOT EXISTS log_tombstones (
+    log_id INTEGER PRIMARY KEY,
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE log_tombstones ENABLE ROW LEVEL SECURITY;
+
+-- Tombstones are only written by the trigger on logs
+DROP POLICY IF EXISTS "Users can view their own log tombstones" ON log_tombstones;
+CREATE POLICY "Users can view their own log tombstones" ON log_tombstones
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- Record deleted logs. Runs as the table owner because users only have
+-- SELECT access to log_tombstones.
+CREATE OR REPLACE FUNCTION record_log_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO log_tombstones (log_id, user_id, deleted_at)
+    VALUES (OLD.id, OLD.user_id, NOW())
+    ON CONFLICT (log_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN OLD;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS record_logs_tombstone ON logs;
+CREATE TRIGGER record_logs_tombstone AFTER DELETE ON logs
+    FOR EACH ROW EXECUTE FUNCTION record_log_tombstone();
+
+-- Serve the "changed since" queries of each sync
+CREATE INDEX IF NOT EXISTS idx_logs_user_updated_at ON logs(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_log_tombstones_user_deleted_at ON log_tombstones(user_id, deleted_at);
+
+-- Tombstones only need to outlive the clients' sync interval (see
+-- TOMBSTONE_RETENTION in log_sync.py); prune old ones periodically with:
+--   DELETE FROM log_tombstones WHERE deleted_at < NOW() - INTERVAL '30 days';
@@ -0,0 +1,28 @@
+-- Migration to compute logs.value in the database
+-- Run this in your Supabase SQL editor
+
+-- Price a log from its category's rate whenever hours or the category are
+-- written, so clients no longer look up the rate before inserting
+CREATE OR REPLACE FUNCTION set_log_value()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_rate DECIMAL(10,2);
+BEGIN
+    IF NEW.category_id IS NULL THEN
+        NEW.value = COALESCE(NEW.value, 0);
+        RETURN NEW;
+    END IF;
+
+    SELECT rate INTO v_rate FROM categories WHERE id = NEW.category_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Category % not found', NEW.category_id
+            USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    NEW.value = NEW.hours * v_rate;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS set_logs_value ON logs;
+CREATE TRIGGER set_logs_value BEFORE INSERT OR UPDATE OF hours, category_id ON logs
+    FOR EACH ROW EXECUTE FUNCTION set_log_value();
@@ -0,0 +1,46 @@
+-- Migration to add set-based repricing of a habit's logged activities
+-- Run this in your Supabase SQL editor
+
+-- Reprice one category's logs at its current rate, optionally only within a
+-- date range. Logs are processed in id order, p_batch_size at a time, each
+-- batch one set-based UPDATE; callers pass back last_id as p_after_id to
+-- continue and can report progress between batches. Runs with the caller's
+-- privileges, so the logs RLS policies still apply.
+CREATE OR REPLACE FUNCTION revalue_category_logs(
+    p_user_id UUID,
+    p_category_id INTEGER,
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL,
+    p_after_id INTEGER DEFAULT 0,
+    p_batch_size INTEGER DEFAULT 5000
+)
+RETURNS TABLE (
+    n_scanned INTEGER,
+    n_updated INTEGER,
+    last_id INTEGER
+) AS $$
+    WITH batch AS (
+        SELECT id
+        FROM logs
+        WHERE user_id = p_user_id
+          AND category_id = p_category_id
+          AND id > p_after_id
+          AND (p_from IS NULL OR date >= p_from)
+          AND (p_to IS NULL OR date <= p_to)
+        ORDER BY id
+        LIMIT p_batch_size
+    ),
+    updated AS (
+        UPDATE logs l
+        SET value = ROUND(l.hours * c.rate, 2)
+        FROM batch b, categories c
+        WHERE l.id = b.id
+          AND c.id = l.category_id
+          AND l.value IS DISTINCT FROM ROUND(l.hours * c.rate, 2)
+        RETURNING l.id
+    )
+    SELECT
+        (SELECT COUNT(*) FROM batch)::INTEGER,
+        (SELECT COUNT(*) FROM updated)::INTEGER,
+        (SELECT MAX(id) FROM batch);
+$$ language 'sql';
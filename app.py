@@ -1,12 +1,22 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
+import numpy as np
 from datetime import datetime, date, timedelta
 import os
+import threading
+import time
+import uuid
+from typing import NamedTuple
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from streamlit.runtime.scriptrunner import add_script_run_ctx
 import json
+from write_queue import WriteQueue
+from charts import cached_figure, category_value_figure, cumulative_chart_data, cumulative_value_figure
+from log_records import LogRecords, HOURS_SCALE, VALUE_SCALE, diff_log_edits
+from metrics import dashboard_metrics, pot_under_rates, user_index
+from storage import Storage, SupabaseStorage, SQLiteStorage, MemoryStorage, SQLITE_PATH, DEFAULT_SETTINGS, rollup_logs
 
 # Load environment variables
 load_dotenv()
@@ -19,9 +29,17 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Storage backend: "supabase" (default), "sqlite" for a local single-user
+# database, or "memory". Without Supabase credentials the app runs in demo
+# mode on sample data held in memory.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+
 # Initialize Supabase client
 @st.cache_resource
 def init_supabase():
+    if STORAGE_BACKEND != "supabase":
+        return None
+    
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_KEY")
     
@@ -49,12 +67,14 @@ def get_demo_logs():
     
     categories = get_demo_categories()
     logs = []
+    # Seeded per day so logs and summaries agree across calls within a rerun
+    rng = random.Random(datetime.now().date().toordinal())
     
     # Generate sample data for the last 30 days
     for i in range(30):
         date = datetime.now() - timedelta(days=i)
-        category = random.choice(categories)
-        hours = round(random.uniform(0.5, 8.0), 1)
+        category = rng.choice(categories)
+        hours = round(rng.uniform(0.5, 8.0), 1)
         value = hours * category['rate']
         
         logs.append({
@@ -68,12 +88,52 @@ def get_demo_logs():
     
     return logs
 
+@st.cache_resource
+def init_storage() -> Storage:
+    if STORAGE_BACKEND == "sqlite":
+        st.info(f"💾 **Local Mode**: your data is stored in `{SQLITE_PATH}`.")
+        return SQLiteStorage(SQLITE_PATH)
+    if supabase is not None:
+        return SupabaseStorage(supabase)
+    return None
+
+def init_demo_storage() -> Storage:
+    """Demo mode: sample data kept in memory for this browser session only.
+    
+    Every session gets its own copy and demo user id, so one visitor's
+    edits are never shown to another.
+    """
+    if "demo_storage" not in st.session_state:
+        user_id = f"demo_user_{uuid.uuid4().hex[:12]}"
+        demo_logs = [
+            dict(log, user_id=user_id, category_id=log["categories"]["id"])
+            for log in get_demo_logs()
+        ]
+        st.session_state.demo_user_id = user_id
+        st.session_state.demo_storage = MemoryStorage(get_demo_categories(), demo_logs)
+    return st.session_state.demo_storage
+
+storage: Storage = init_storage() or init_demo_storage()
+
+def storage_scope() -> str:
+    """Cache key part that keeps the shared caches apart per demo session"""
+    return st.session_state.get("demo_user_id", "")
+
 # Authentication functions
+def start_local_session(email: str):
+    """Sign in without Supabase: one local user whose data lives in `storage`"""
+    user_id = "local_user" if STORAGE_BACKEND == "sqlite" else st.session_state.demo_user_id
+    user_obj = type('obj', (object,), {'id': user_id, 'email': email})()
+    st.session_state.user = user_obj
+    st.session_state.authenticated = True
+    st.session_state.user_email = email
+    st.session_state.user_id = user_id
+    return type('obj', (object,), {'user': user_obj})()
+
 def sign_up(email: str, password: str):
     if supabase is None:
-        # Demo mode - simulate successful signup
-        user_obj = type('obj', (object,), {'id': 'demo_user', 'email': email})()
-        return type('obj', (object,), {'user': user_obj})()
+        # Demo or local mode - simulate successful signup
+        return start_local_session(email)
     
     try:
         response = supabase.auth.sign_up({
@@ -89,6 +149,7 @@ def sign_up(email: str, password: str):
             st.session_state.authenticated = True
             st.session_state.user_email = email
             st.session_state.user_id = response.user.id
+            remember_session(response.session)
             st.success("Account created successfully! You are now signed in.")
             return response
         else:
@@ -104,9 +165,8 @@ def sign_up(email: str, password: str):
 
 def sign_in(email: str, password: str):
     if supabase is None:
-        # Demo mode - simulate successful signin
-        user_obj = type('obj', (object,), {'id': 'demo_user', 'email': email})()
-        return type('obj', (object,), {'user': user_obj})()
+        # Demo or local mode - simulate successful signin
+        return start_local_session(email)
     
     try:
         response = supabase.auth.sign_in_with_password({
@@ -119,6 +179,7 @@ def sign_in(email: str, password: str):
             st.session_state.authenticated = True
             st.session_state.user_email = email
             st.session_state.user_id = response.user.id
+            remember_session(response.session)
             st.success("Signed in successfully!")
             return response
         else:
@@ -143,16 +204,50 @@ def sign_out():
         st.session_state.authenticated = False
         st.session_state.user_email = None
         st.session_state.user_id = None
+        st.session_state.settings = None
+        st.session_state.session_expires_at = None
         st.rerun()
     except Exception as e:
         st.error(f"Sign out error: {str(e)}")
 
+# The access token's expiry is kept in the session, so reruns only go back
+# to Supabase Auth when the token is about to expire or a request was
+# rejected as unauthorized.
+AUTH_REFRESH_MARGIN = 60  # seconds before expiry at which the session is re-checked
+
+def remember_session(session):
+    st.session_state.session_expires_at = getattr(session, "expires_at", None) if session else None
+
+def session_is_fresh():
+    expires_at = st.session_state.get("session_expires_at")
+    return expires_at is not None and time.time() < expires_at - AUTH_REFRESH_MARGIN
+
+def is_auth_error(e: Exception):
+    """Whether an API error means the access token was rejected (HTTP 401)"""
+    code = str(getattr(e, "code", "") or "")
+    return code in ("401", "PGRST301", "PGRST302") or "jwt expired" in str(e).lower()
+
+def expire_session_on_auth_error(e: Exception):
+    """Make the next check_auth_status() refresh the session after a 401"""
+    if is_auth_error(e):
+        st.session_state.session_expires_at = None
+
+def clear_session_state():
+    st.session_state.user = None
+    st.session_state.authenticated = False
+    st.session_state.user_email = None
+    st.session_state.user_id = None
+    st.session_state.session_expires_at = None
+
 def check_auth_status():
     """Check if user is still authenticated"""
     if supabase is None:
         return st.session_state.get('user') is not None
     
-    # Always try to get current session first
+    if st.session_state.get('user') and st.session_state.get('authenticated') and session_is_fresh():
+        return True
+    
+    # Fetch the session; the client refreshes an expired access token here
     try:
         session = supabase.auth.get_session()
         if session and session.user:
@@ -161,13 +256,11 @@ def check_auth_status():
             st.session_state.authenticated = True
             st.session_state.user_email = session.user.email
             st.session_state.user_id = session.user.id
+            remember_session(session)
             return True
         else:
             # No valid session, clear state
-            st.session_state.user = None
-            st.session_state.authenticated = False
-            st.session_state.user_email = None
-            st.session_state.user_id = None
+            clear_session_state()
             return False
     except Exception as e:
         # If there's an error, check if we have cached user info
@@ -175,209 +268,402 @@ def check_auth_status():
             # Keep the cached user for now
             return True
         else:
-            # Clear state
-            st.session_state.user = None
-            st.session_state.authenticated = False
-            st.session_state.user_email = None
-            st.session_state.user_id = None
+            clear_session_state()
             return False
 
 # Habit management functions
+CATEGORIES_CACHE_TTL = 300  # seconds
+
+@st.cache_data(ttl=CATEGORIES_CACHE_TTL, show_spinner=False)
+def fetch_categories(scope: str):
+    """Fetch the categories table once for every session on this server.
+
+    Categories are global rather than per user, so a single cached copy is
+    shared by all sessions and cleared whenever a habit is added, updated
+    or deleted. `scope` only differs between demo sessions.
+    """
+    return storage.list_categories()
+
+@st.cache_data(ttl=CATEGORIES_CACHE_TTL, show_spinner=False)
+def fetch_category_rates(scope: str):
+    """Fetch the rate history of all categories (shared like the categories)"""
+    return storage.list_category_rates()
+
+def get_category_rates():
+    """Get every rate each habit has had and the date it took effect"""
+    try:
+        return fetch_category_rates(storage_scope())
+    except Exception as e:
+        expire_session_on_auth_error(e)
+        st.warning(f"Could not load habit rate history: {str(e)}")
+        return []
+
 def get_habits():
     """Get all habits/categories with their monetary values"""
-    if supabase is None:
-        return get_demo_categories()
-    
     try:
-        response = supabase.table("categories").select("*").order("name").execute()
-        return response.data
+        return fetch_categories(storage_scope())
     except Exception as e:
+        expire_session_on_auth_error(e)
         st.error(f"Error fetching habits: {str(e)}")
         return []
 
 def add_habit(name: str, rate: float, description: str = ""):
     """Add a new habit/category"""
-    if supabase is None:
-        st.success("Habit added! (Demo mode - not saved)")
-        return True
-    
     try:
-        response = supabase.table("categories").insert({
-            "name": name,
-            "rate": rate,
-            "description": description
-        }).execute()
-        return response.data is not None
+        result = storage.add_category(name, rate, description)
+        fetch_categories.clear()
+        fetch_category_rates.clear()
+        return result is not None
     except Exception as e:
+        expire_session_on_auth_error(e)
         st.error(f"Error adding habit: {str(e)}")
         return False
 
 def update_habit(habit_id: int, name: str, rate: float, description: str = ""):
     """Update an existing habit"""
-    if supabase is None:
-        st.success("Habit updated! (Demo mode - not saved)")
-        return True
-    
     try:
-        response = supabase.table("categories").update({
+        result = storage.update_category(habit_id, {
             "name": name,
             "rate": rate,
             "description": description
-        }).eq("id", habit_id).execute()
-        return response.data is not None
+        })
+        fetch_categories.clear()
+        fetch_category_rates.clear()
+        # Cached logs embed the category row, so they are stale for every user
+        fetch_user_logs.clear()
+        return result is not None
     except Exception as e:
+        expire_session_on_auth_error(e)
         st.error(f"Error updating habit: {str(e)}")
         return False
 
 def delete_habit(habit_id: int):
     """Delete a habit"""
-    if supabase is None:
-        st.success("Habit deleted! (Demo mode - not saved)")
-        return True
-    
     try:
-        response = supabase.table("categories").delete().eq("id", habit_id).execute()
-        return response.data is not None
+        result = storage.delete_category(habit_id)
+        fetch_categories.clear()
+        fetch_category_rates.clear()
+        return result
     except Exception as e:
+        expire_session_on_auth_error(e)
         st.error(f"Error deleting habit: {str(e)}")
         return False
 
-def update_log(log_id: int, date_val: date, hours: float, category_id: int, note: str = ""):
-    """Update an existing log entry"""
-    if supabase is None:
-        st.success("Log updated! (Demo mode - not saved)")
-        return True
+def current_user_id():
+    user = st.session_state.get("user")
+    return user.id if user else None
+
+def revalue_habit_logs(user_id: str, habit_id: int, expected: int, date_from: date = None, date_to: date = None):
+    """Reprice a habit's logged activities at its current rate, showing progress.
+    
+    `expected` is the number of logs in range and only scales the progress bar.
+    Returns the number of logs whose value changed, or None on error.
+    """
+    progress = st.progress(0.0, text="Repricing activities...")
+    scanned = updated = 0
+    try:
+        for n_scanned, n_updated in storage.revalue_logs(
+            user_id, habit_id,
+            date_from.isoformat() if date_from else None,
+            date_to.isoformat() if date_to else None
+        ):
+            scanned += n_scanned
+            updated += n_updated
+            progress.progress(min(scanned / expected, 1.0) if expected else 1.0, text=f"Repriced {scanned:,} of {expected:,} activities")
+        return updated
+    except Exception as e:
+        expire_session_on_auth_error(e)
+        st.error(f"Error repricing activities: {str(e)}")
+        return None
+    finally:
+        progress.empty()
+        if updated:
+            bump_log_version(user_id)
+
+def bulk_update_logs(user_id: str, updates: list):
+    """Write several edited log entries in a single upsert request.
+    
+    Each update is a dict with id, date, hours, category_id and note. Returns
+    a dict mapping each log id to whether it was written.
+    """
+    results = {update["id"]: False for update in updates}
+    if not updates:
+        return results
+    rows = [{
+        "id": update["id"],
+        "user_id": user_id,
+        "date": update["date"].isoformat(),
+        "hours": update["hours"],
+        "category_id": int(update["category_id"]),
+        "note": update["note"]
+    } for update in updates]
     
     try:
-        # Get category rate to calculate value
-        category_response = supabase.table("categories").select("rate").eq("id", category_id).execute()
-        if not category_response.data:
-            st.error("Category not found")
-            return False
-        
-        rate = category_response.data[0]['rate']
-        value = hours * rate
-        
-        response = supabase.table("logs").update({
-            "date": date_val.isoformat(),
-            "hours": hours,
-            "category_id": category_id,
-            "note": note,
-            "value": value
-        }).eq("id", log_id).execute()
-        return response.data is not None
+        written = storage.upsert_logs(user_id, rows)
+        bump_log_version(user_id)
+        for row in written:
+            results[row["id"]] = True
     except Exception as e:
-        st.error(f"Error updating log: {str(e)}")
-        return False
+        expire_session_on_auth_error(e)
+        st.error(f"Error updating logs: {str(e)}")
+    return results
 
-def delete_log(log_id: int):
-    """Delete a log entry"""
-    if supabase is None:
-        st.success("Log deleted! (Demo mode - not saved)")
-        return True
+def bulk_delete_logs(user_id: str, log_ids: list):
+    """Delete several log entries in a single request.
     
+    Returns a dict mapping each log id to whether it was deleted.
+    """
+    results = {log_id: False for log_id in log_ids}
     try:
-        response = supabase.table("logs").delete().eq("id", log_id).execute()
-        return response.data is not None
+        deleted = storage.delete_logs(user_id, log_ids)
+        bump_log_version(user_id)
+        for log_id in deleted:
+            results[log_id] = True
     except Exception as e:
-        st.error(f"Error deleting log: {str(e)}")
-        return False
+        expire_session_on_auth_error(e)
+        st.error(f"Error deleting logs: {str(e)}")
+    return results
 
-def get_user_logs(user_id: str, limit: int = 100):
-    if supabase is None:
-        return get_demo_logs()
+# Log caching: every write made through this app bumps the user's data
+# version, so reruns that only touch the UI are served from memory.
+LOGS_CACHE_TTL = 600  # seconds; picks up writes made outside the app (e.g. log_hours.py)
+
+@st.cache_resource
+def get_log_versions():
+    """Process-wide map of user_id -> data version, shared by all sessions"""
+    return {}
+
+def get_log_version(user_id: str):
+    return get_log_versions().get(user_id, 0)
+
+def bump_log_version(user_id: str = None):
+    """Invalidate the cached logs of a user after a write"""
+    user_id = user_id or current_user_id()
+    if user_id:
+        versions = get_log_versions()
+        versions[user_id] = versions.get(user_id, 0) + 1
+
+RECENT_PAGE_SIZE = 20  # rows per page of the Recent Activities grid
+
+@st.cache_data(ttl=LOGS_CACHE_TTL, max_entries=256, show_spinner=False)
+def fetch_user_logs(user_id: str, limit: int, after: tuple, version: int):
+    """Fetch one keyset page of a user's logs; `version` only serves as part of the cache key"""
+    return LogRecords.from_rows(storage.log_page(user_id, limit, after))
+
+def get_user_logs(user_id: str, limit: int = RECENT_PAGE_SIZE, after: tuple = None):
+    """Get a page of the user's logs, newest first, after the (date, id) cursor `after`"""
+    try:
+        return fetch_user_logs(user_id, limit, after, get_log_version(user_id))
+    except Exception as e:
+        expire_session_on_auth_error(e)
+        st.error(f"Error fetching logs: {str(e)}")
+        return LogRecords.from_rows([])
+
+def get_all_user_logs(user_id: str):
+    """Get every log of the user.
     
+    With Supabase this is a local snapshot kept current by delta sync and
+    persisted to disk; the local backends read their own tables directly.
+    The dashboard only needs it when the daily rollups cannot be read.
+    """
     try:
-        response = supabase.table("logs").select("*, categories(*)").eq("user_id", user_id).order("date", desc=True).limit(limit).execute()
-        return response.data
+        return storage.all_logs(user_id)
     except Exception as e:
+        expire_session_on_auth_error(e)
         st.error(f"Error fetching logs: {str(e)}")
         return []
 
+@st.cache_data(ttl=LOGS_CACHE_TTL, max_entries=256, show_spinner=False)
+def fetch_daily_rollups(user_id: str, version: int):
+    """Fetch the user's per-day, per-category buckets in date order"""
+    return storage.daily_rollups(user_id)
+
+def get_daily_rollups(user_id: str):
+    """Get the user's full history as daily buckets maintained by the backend"""
+    try:
+        return fetch_daily_rollups(user_id, get_log_version(user_id))
+    except Exception as e:
+        expire_session_on_auth_error(e)
+        st.warning(f"Could not load daily rollups from the database, aggregating logs instead: {str(e)}")
+        return rollup_logs(get_all_user_logs(user_id))
+
+@st.cache_data(ttl=LOGS_CACHE_TTL, max_entries=256, show_spinner=False)
+def fetch_log_summary(user_id: str, version: int):
+    """Fetch the user's per-category totals"""
+    return storage.log_summary(user_id)
+
+def get_log_summary(user_id: str):
+    """Get the per-category totals behind the headline metrics and goal calculator"""
+    try:
+        return fetch_log_summary(user_id, get_log_version(user_id))
+    except Exception as e:
+        expire_session_on_auth_error(e)
+        st.warning(f"Could not load the log summary from the database, totalling daily rollups instead: {str(e)}")
+        return None
+
+@st.cache_resource
+def init_write_queue():
+    """Process-wide write-ahead queue for new logs.
+    
+    Only used with Supabase; the local backends are fast enough to write
+    directly.
+    """
+    if not isinstance(storage, SupabaseStorage):
+        return None
+    # Delivery runs on the queue's own thread, outside any script run
+    versions = get_log_versions()
+    def delivered(user_id):
+        versions[user_id] = versions.get(user_id, 0) + 1
+    queue = WriteQueue(storage, on_delivered=delivered)
+    queue.start()
+    return queue
+
+write_queue = init_write_queue()
+
+def get_pending_logs(user_id: str):
+    """Logs journaled locally that have not reached the backend yet"""
+    if write_queue is None:
+        return []
+    try:
+        return write_queue.pending(user_id)
+    except Exception as e:
+        st.error(f"Error reading the write queue: {str(e)}")
+        return []
+
+def get_failed_logs(user_id: str):
+    """Logs the backend rejected, or that kept failing; they are not retried"""
+    if write_queue is None:
+        return []
+    try:
+        return write_queue.failed(user_id)
+    except Exception as e:
+        st.error(f"Error reading the write queue: {str(e)}")
+        return []
+
+def discard_failed_logs(user_id: str):
+    try:
+        write_queue.discard_failed(user_id)
+    except Exception as e:
+        st.error(f"Error clearing the write queue: {str(e)}")
+
 def insert_log(user_id: str, date_val: date, hours: float, category_id: int, note: str = ""):
-    if supabase is None:
-        # Demo mode - just show success message
-        st.success("Activity logged successfully! (Demo mode - data not saved)")
-        return [{"id": 1, "user_id": user_id, "date": date_val.isoformat(), "hours": hours, "category_id": category_id, "note": note}]
+    """Log an activity; with Supabase it is queued and delivered in the background.
     
+    The value is computed by the backend from the category rate.
+    """
     try:
-        # Get category rate to calculate value
-        category_response = supabase.table("categories").select("rate").eq("id", category_id).execute()
-        if not category_response.data:
-            st.error("Category not found")
-            return None
-        
-        rate = category_response.data[0]['rate']
-        value = hours * rate
-        
-        response = supabase.table("logs").insert({
+        row = {
             "user_id": user_id,
             "date": date_val.isoformat(),
             "hours": hours,
             "category_id": category_id,
-            "note": note,
-            "value": value
-        }).execute()
-        return response.data
+            "note": note
+        }
+        if write_queue is not None:
+            return [dict(row, client_id=write_queue.enqueue(row))]
+        
+        result = storage.insert_log(row)
+        bump_log_version(user_id)
+        return [result] if result else None
     except Exception as e:
+        expire_session_on_auth_error(e)
         st.error(f"Error inserting log: {str(e)}")
         return None
 
 def get_user_settings(user_id: str):
-    if supabase is None:
-        return {"savings_goal": 100000.00, "currency": "USD", "goal_date": "2025-12-31"}
-    
+    """Get the user's settings, read once per session and kept until changed"""
+    cached = st.session_state.get("settings")
+    if cached and cached.get("user_id") == user_id:
+        return cached
     try:
-        response = supabase.table("settings").select("*").eq("user_id", user_id).execute()
-        if response.data:
-            return response.data[0]
-        else:
-            # Create default settings
-            default_settings = {
-                "user_id": user_id,
-                "savings_goal": 100000.00,
-                "currency": "USD",
-                "goal_date": "2025-12-31"
-            }
-            supabase.table("settings").insert(default_settings).execute()
-            return default_settings
+        # A user without a settings row gets the table defaults; the row is
+        # created by the first update_settings()
+        settings = storage.get_settings(user_id) or dict(DEFAULT_SETTINGS, user_id=user_id)
+        st.session_state.settings = settings
+        return settings
     except Exception as e:
+        expire_session_on_auth_error(e)
         st.error(f"Error fetching settings: {str(e)}")
-        return {"savings_goal": 100000.00, "currency": "USD", "goal_date": "2025-12-31"}
+        return dict(DEFAULT_SETTINGS)
+
+def get_goal_date(settings: dict):
+    """The saved goal date, or the default when it is missing or malformed"""
+    try:
+        return datetime.strptime(settings.get("goal_date") or "", "%Y-%m-%d").date()
+    except ValueError:
+        return date(2025, 12, 31)
 
 def update_settings(user_id: str, savings_goal: float, currency: str = "USD", goal_date: str = None):
-    if supabase is None:
-        # Demo mode - just show success message
-        settings_data = {"user_id": user_id, "savings_goal": savings_goal, "currency": currency}
-        if goal_date:
-            settings_data["goal_date"] = goal_date
-        st.success("Settings updated! (Demo mode - data not saved)")
-        return [settings_data]
-    
     try:
-        # First, check if settings exist for this user
-        existing_response = supabase.table("settings").select("*").eq("user_id", user_id).execute()
-        
         settings_data = {
             "savings_goal": savings_goal,
             "currency": currency
         }
         if goal_date:
             settings_data["goal_date"] = goal_date
-            
-        if existing_response.data:
-            # Update existing settings
-            response = supabase.table("settings").update(settings_data).eq("user_id", user_id).execute()
-        else:
-            # Insert new settings
-            settings_data["user_id"] = user_id
-            response = supabase.table("settings").insert(settings_data).execute()
-            
-        return response.data
+        
+        # One upsert on settings.user_id creates or updates the row
+        result = storage.upsert_settings(user_id, settings_data)
+        st.session_state.settings = result
+        return [result] if result else None
     except Exception as e:
+        expire_session_on_auth_error(e)
         st.error(f"Error updating settings: {str(e)}")
         return None
 
+# Parallel data loading
+class DashboardData(NamedTuple):
+    """Everything show_main_app() needs from the backend for one rerun"""
+    user_id: str
+    logs: LogRecords
+    daily_rollups: list
+    summary: list
+    habits: list
+    rate_history: list
+    settings: dict
+
+class DashboardLoad:
+    """Run the independent dashboard fetches at the same time.
+    
+    Each fetch gets its own thread carrying the script run context, so the
+    Streamlit caches and error messages behave as on the main thread. The
+    rerun then waits only for the slowest request instead of the sum.
+    """
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self._results = {}
+        self._errors = {}
+        fetches = {
+            "logs": get_user_logs,
+            "daily_rollups": get_daily_rollups,
+            "summary": get_log_summary,
+            "habits": lambda _user_id: get_habits(),
+            "rate_history": lambda _user_id: get_category_rates(),
+            "settings": get_user_settings
+        }
+        self._threads = [
+            add_script_run_ctx(threading.Thread(target=self._run, args=(name, fetch), daemon=True))
+            for name, fetch in fetches.items()
+        ]
+        for thread in self._threads:
+            thread.start()
+    
+    def _run(self, name, fetch):
+        try:
+            self._results[name] = fetch(self.user_id)
+        except Exception as e:
+            self._errors[name] = e
+    
+    def result(self) -> DashboardData:
+        for thread in self._threads:
+            thread.join()
+        for error in self._errors.values():
+            raise error
+        return DashboardData(user_id=self.user_id, **self._results)
+
+def load_dashboard_data(user_id: str) -> DashboardData:
+    return DashboardLoad(user_id).result()
+
 # Initialize session state
 if "user" not in st.session_state:
     st.session_state.user = None
@@ -422,6 +708,7 @@ def show_auth():
                 st.error("Please fill in all fields")
 
 # Activity logging form
+@st.fragment
 def show_activity_form(user_id: str, habits: list):
     """Show the activity logging form"""
     st.subheader("📝 Log New Activity")
@@ -477,17 +764,236 @@ def show_activity_form(user_id: str, habits: list):
             if result:
                 st.success("Activity logged successfully!")
                 st.rerun()
+    
+    pending = get_pending_logs(user_id)
+    if pending:
+        message = f"⏳ {len(pending)} logged {'activity' if len(pending) == 1 else 'activities'} waiting to sync"
+        if pending[0]["last_error"]:
+            message += f" (retrying: {pending[0]['last_error']})"
+        st.caption(message)
+    
+    failed = get_failed_logs(user_id)
+    if failed:
+        st.warning(
+            f"⚠️ {len(failed)} logged {'activity' if len(failed) == 1 else 'activities'} could not be saved "
+            f"and will not be retried: {failed[-1]['last_error']}"
+        )
+        st.button("Dismiss", key="dismiss_failed_logs", on_click=discard_failed_logs, args=(user_id,))
+
+# Dashboard panels. Each one is a fragment: interacting with its widgets
+# reruns only that panel, and a full rerun is requested once data changes.
+@st.fragment
+def show_goal_calculator(user_id: str, settings: dict, metrics, savings_goal: float):
+    """Pick a custom goal date and see the daily earnings it needs"""
+    with st.expander("📅 Set Custom Goal Date"):
+        # Get current goal date from settings or use default
+        current_goal_date_str = settings.get("goal_date")
+        current_goal_date = metrics.goal_date
+        
+        # Debug info
+        st.caption(f"Current saved goal date: {current_goal_date_str or 'Not set'}")
+        
+        goal_date_input = st.date_input(
+            "Target Goal Date", 
+            value=current_goal_date,
+            help="When do you want to reach your savings goal?"
+        )
+        
+        # Auto-save goal date when changed
+        if goal_date_input != current_goal_date:
+            if st.button("💾 Save Goal Date"):
+                result = update_settings(user_id, savings_goal, settings.get("currency", "USD"), goal_date_input.isoformat())
+                if result:
+                    st.success("Goal date updated!")
+                    st.rerun()
+                else:
+                    st.error("Failed to update goal date")
+            else:
+                st.info("⚠️ Goal date changed - click 'Save Goal Date' to update")
+        
+        # Calculate required daily earnings for custom date
+        days_to_custom_goal = (goal_date_input - date.today()).days
+        if days_to_custom_goal > 0:
+            required_daily = metrics.remaining_amount / days_to_custom_goal
+            st.info(f"**Required daily earnings**: ${required_daily:.2f}")
+            
+            # Show comparison with current pace
+            if metrics.current_daily_avg > 0:
+                pace_ratio = required_daily / metrics.current_daily_avg
+                if pace_ratio > 1:
+                    st.warning(f"You need to increase your pace by {pace_ratio:.1f}x")
+                else:
+                    st.success(f"You're on track! Current pace is {1/pace_ratio:.1f}x faster than needed")
+
+@st.fragment
+def show_habit_management(user_id: str, habits: list, daily: pd.DataFrame):
+    """List, add, edit and reprice habits"""
+    # Link to habit guide
+    st.info("💡 **Need help assigning values?** Check out our [Habit Value Guide](http://localhost:8503)")
+    
+    # Show current habits
+    if habits:
+        st.write("**Current Habits:**")
+        for habit in habits:
+            rate_color = "green" if habit['rate'] > 0 else "red"
+            st.write(f"• **{habit['name']}**: ${habit['rate']:.2f}/hour")
+            if habit.get('description'):
+                st.caption(f"  _{habit['description']}_")
+    
+    # Add new habit form
+    with st.expander("➕ Add New Habit"):
+        with st.form("add_habit_form"):
+            habit_name = st.text_input("Habit Name", placeholder="e.g., Exercise, Reading, Gaming")
+            habit_rate = st.number_input("Hourly Rate ($)", value=0.0, step=1.0, format="%.2f")
+            habit_desc = st.text_area("Description (optional)", placeholder="What is this habit about?")
+            
+            if st.form_submit_button("Add Habit"):
+                if habit_name and habit_rate != 0:
+                    if add_habit(habit_name, habit_rate, habit_desc):
+                        st.rerun()
+                else:
+                    st.error("Please enter habit name and rate")
+    
+    # Edit existing habits
+    with st.expander("✏️ Edit Habits"):
+        for habit in habits:
+            with st.form(f"edit_habit_{habit['id']}"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    new_name = st.text_input("Name", value=habit['name'], key=f"name_{habit['id']}")
+                    new_rate = st.number_input("Rate ($)", value=float(habit['rate']), step=1.0, format="%.2f", key=f"rate_{habit['id']}")
+                with col2:
+                    new_desc = st.text_area("Description", value=habit.get('description', ''), key=f"desc_{habit['id']}")
+                    if st.form_submit_button("Update"):
+                        if update_habit(habit['id'], new_name, new_rate, new_desc):
+                            st.rerun()
+                    if st.form_submit_button("Delete", type="secondary"):
+                        if delete_habit(habit['id']):
+                            st.rerun()
+    
+    # Past activities keep the rate they were logged at until repriced
+    with st.expander("💱 Reprice Activities"):
+        habit_names = {habit['name']: habit['id'] for habit in habits}
+        reprice_name = st.selectbox("Habit", list(habit_names.keys()), key="reprice_habit")
+        reprice_id = habit_names.get(reprice_name)
+        limit_range = st.checkbox("Only a date range", key="reprice_limit_range")
+        reprice_from = reprice_to = None
+        if limit_range:
+            reprice_from = st.date_input("From", value=date.today() - timedelta(days=30), key="reprice_from")
+            reprice_to = st.date_input("To", value=date.today(), key="reprice_to")
+        
+        if st.button("Reprice at current rate", key="reprice_submit") and reprice_id is not None:
+            in_range = daily["category_id"] == reprice_id
+            if reprice_from is not None:
+                in_range &= daily["date"] >= pd.Timestamp(reprice_from)
+            if reprice_to is not None:
+                in_range &= daily["date"] <= pd.Timestamp(reprice_to)
+            expected = int(daily.loc[in_range, "n_logs"].sum())
+            updated = revalue_habit_logs(user_id, reprice_id, expected, reprice_from, reprice_to)
+            if updated:
+                st.success(f"Repriced {updated:,} {'activity' if updated == 1 else 'activities'}")
+                st.rerun()
+            elif updated == 0:
+                st.info("These activities already use the current rate.")
+
+@st.fragment
+def show_recent_activities(user_id: str, habits: list):
+    """Editable grid of the user's activities, one keyset page at a time"""
+    # Cursor of every page visited so far; the last one is the page shown
+    cursors_key = f"recent_cursors_{user_id}"
+    cursors = st.session_state.setdefault(cursors_key, [None])
+    page = get_user_logs(user_id, RECENT_PAGE_SIZE, cursors[-1])
+    while not page and len(cursors) > 1:
+        # The page emptied (e.g. its rows were deleted); step back
+        cursors.pop()
+        page = get_user_logs(user_id, RECENT_PAGE_SIZE, cursors[-1])
+    
+    habit_ids = {habit['name']: habit['id'] for habit in habits}
+    original = page.to_frame()[["id", "date", "category_id", "category_name", "hours", "value", "note"]]
+    original["date"] = original["date"].dt.date
+    original["category_name"] = original["category_name"].astype(str)
+    original["delete"] = False
+    
+    # Keyed on the page and data version so a save or page change starts clean
+    edited = st.data_editor(
+        original,
+        key=f"recent_editor_{len(cursors)}_{get_log_version(user_id)}",
+        hide_index=True,
+        num_rows="fixed",
+        use_container_width=True,
+        disabled=["id", "value"],
+        column_order=["date", "category_name", "hours", "value", "note", "delete"],
+        column_config={
+            "date": st.column_config.DateColumn("Date", required=True),
+            "category_name": st.column_config.SelectboxColumn("Habit", options=list(habit_ids), required=True),
+            "hours": st.column_config.NumberColumn("Hours", min_value=0.1, max_value=24.0, step=0.1, required=True),
+            "value": st.column_config.NumberColumn("Value", format="$%.2f", help="Recomputed from the habit rate on save"),
+            "note": st.column_config.TextColumn("Note"),
+            "delete": st.column_config.CheckboxColumn("🗑️ Delete")
+        }
+    )
+    
+    updates, deletes, unknown = diff_log_edits(original, edited, habit_ids)
+    if unknown:
+        st.warning(f"Pick a habit for edited activities with an unknown habit before saving: {', '.join(str(log_id) for log_id in unknown)}")
+    # Paging happens in the click callbacks, before the fragment reruns
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        st.button("← Newer", key="recent_newer", disabled=len(cursors) == 1, on_click=cursors.pop)
+    with col2:
+        next_cursor = (date.fromordinal(int(page.date_ordinal[-1])).isoformat(), int(page.id[-1])) if len(page) else None
+        st.button("Older →", key="recent_older", disabled=len(page) < RECENT_PAGE_SIZE,
+                  on_click=cursors.append, args=(next_cursor,))
+    with col3:
+        st.caption(f"Page {len(cursors)} · {len(updates)} edited, {len(deletes)} marked for deletion")
+    
+    if st.button("💾 Save Changes", key="recent_save", disabled=not (updates or deletes)):
+        # Only the changed rows are sent: one upsert and one delete at most
+        results = {}
+        if updates:
+            results.update(bulk_update_logs(user_id, updates))
+        if deletes:
+            results.update(bulk_delete_logs(user_id, deletes))
+        failed = [log_id for log_id, ok in results.items() if not ok]
+        if failed:
+            st.error(f"Could not update activities: {', '.join(str(log_id) for log_id in failed)}")
+        else:
+            st.rerun()
+    
+    # Quick stats for the activities on this page
+    st.markdown("---")
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("📊 Total Activities", len(page))
+    
+    with col2:
+        avg_hours = page.hours_centi.mean() / HOURS_SCALE if len(page) else 0.0
+        st.metric("⏱️ Avg Hours/Activity", f"{avg_hours:.1f}")
+    
+    with col3:
+        avg_value = page.value_cents.mean() / VALUE_SCALE if len(page) else 0.0
+        st.metric("💰 Avg Value/Activity", f"${avg_value:.2f}")
 
 # Main app UI
-def show_main_app():
+def show_main_app(prefetch: DashboardLoad = None):
     user = st.session_state.user
     
     # Get data first (needed for sidebar calculations)
-    logs = get_user_logs(user.id)
-    habits = get_habits()
-    settings = get_user_settings(user.id)
+    if prefetch is None or prefetch.user_id != user.id:
+        prefetch = DashboardLoad(user.id)
+    data = prefetch.result()
+    logs = data.logs
+    habits = data.habits
+    settings = data.settings
     savings_goal = float(settings.get("savings_goal", 100000))
     
+    # Every figure over the user's full history, from the daily buckets; the
+    # sidebar and the main panel both read this one result
+    metrics = dashboard_metrics(data.daily_rollups, savings_goal, get_goal_date(settings), summary=data.summary)
+    # Running totals per day, kept per user and only rebuilt from the first changed day
+    index = user_index(user.id, metrics.daily)
+    
     # Sidebar
     with st.sidebar:
         st.title("⏰ Productivity Tracker")
@@ -521,131 +1027,14 @@ def show_main_app():
         # Goal Timeline Calculator
         st.subheader("🎯 Goal Timeline Calculator")
         
-        with st.expander("📅 Set Custom Goal Date"):
-            # Get current goal date from settings or use default
-            current_goal_date_str = settings.get("goal_date")
-            if current_goal_date_str:
-                try:
-                    current_goal_date = datetime.strptime(current_goal_date_str, "%Y-%m-%d").date()
-                except:
-                    current_goal_date = date(2025, 12, 31)
-            else:
-                current_goal_date = date(2025, 12, 31)
-            
-            # Debug info
-            st.caption(f"Current saved goal date: {current_goal_date_str or 'Not set'}")
-            
-            goal_date_input = st.date_input(
-                "Target Goal Date", 
-                value=current_goal_date,
-                help="When do you want to reach your savings goal?"
-            )
-            
-            # Auto-save goal date when changed
-            if goal_date_input != current_goal_date:
-                if st.button("💾 Save Goal Date"):
-                    result = update_settings(user.id, savings_goal, settings.get("currency", "USD"), goal_date_input.isoformat())
-                    if result:
-                        st.success("Goal date updated!")
-                        st.rerun()
-                    else:
-                        st.error("Failed to update goal date")
-                else:
-                    st.info("⚠️ Goal date changed - click 'Save Goal Date' to update")
-            
-            # Calculate required daily earnings for custom date
-            days_to_custom_goal = (goal_date_input - date.today()).days
-            if days_to_custom_goal > 0:
-                # Calculate remaining amount here
-                remaining_amount_sidebar = savings_goal
-                if logs:
-                    df_temp = pd.DataFrame(logs)
-                    total_value_temp = df_temp['value'].sum()
-                    remaining_amount_sidebar = savings_goal - total_value_temp
-                
-                required_daily = remaining_amount_sidebar / days_to_custom_goal
-                st.info(f"**Required daily earnings**: ${required_daily:.2f}")
-                
-                # Calculate current daily average for comparison
-                current_daily_avg_sidebar = 0
-                if logs:
-                    df_temp = pd.DataFrame(logs)
-                    df_temp['date'] = pd.to_datetime(df_temp['date'])
-                    days_with_data = (df_temp['date'].max() - df_temp['date'].min()).days + 1
-                    current_daily_avg_sidebar = df_temp['value'].sum() / max(days_with_data, 1)
-                
-                # Show comparison with current pace
-                if current_daily_avg_sidebar > 0:
-                    pace_ratio = required_daily / current_daily_avg_sidebar
-                    if pace_ratio > 1:
-                        st.warning(f"You need to increase your pace by {pace_ratio:.1f}x")
-                    else:
-                        st.success(f"You're on track! Current pace is {1/pace_ratio:.1f}x faster than needed")
+        show_goal_calculator(user.id, settings, metrics, savings_goal)
         
         st.markdown("---")
         
         # Habit Management
         st.subheader("🎯 Habit Management")
         
-        # Link to habit guide
-        st.info("💡 **Need help assigning values?** Check out our [Habit Value Guide](http://localhost:8503)")
-        
-        # Show current habits
-        habits = get_habits()
-        if habits:
-            st.write("**Current Habits:**")
-            for habit in habits:
-                rate_color = "green" if habit['rate'] > 0 else "red"
-                st.write(f"• **{habit['name']}**: ${habit['rate']:.2f}/hour")
-                if habit.get('description'):
-                    st.caption(f"  _{habit['description']}_")
-        
-        # Add new habit form
-        with st.expander("➕ Add New Habit"):
-            with st.form("add_habit_form"):
-                habit_name = st.text_input("Habit Name", placeholder="e.g., Exercise, Reading, Gaming")
-                habit_rate = st.number_input("Hourly Rate ($)", value=0.0, step=1.0, format="%.2f")
-                habit_desc = st.text_area("Description (optional)", placeholder="What is this habit about?")
-                
-                if st.form_submit_button("Add Habit"):
-                    if habit_name and habit_rate != 0:
-                        if add_habit(habit_name, habit_rate, habit_desc):
-                            st.rerun()
-                    else:
-                        st.error("Please enter habit name and rate")
-        
-        # Edit existing habits
-        with st.expander("✏️ Edit Habits"):
-            for habit in habits:
-                with st.form(f"edit_habit_{habit['id']}"):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        new_name = st.text_input("Name", value=habit['name'], key=f"name_{habit['id']}")
-                        new_rate = st.number_input("Rate ($)", value=float(habit['rate']), step=1.0, format="%.2f", key=f"rate_{habit['id']}")
-                    with col2:
-                        new_desc = st.text_area("Description", value=habit.get('description', ''), key=f"desc_{habit['id']}")
-                        if st.form_submit_button("Update"):
-                            if update_habit(habit['id'], new_name, new_rate, new_desc):
-                                st.rerun()
-                        if st.form_submit_button("Delete", type="secondary"):
-                            if delete_habit(habit['id']):
-                                st.rerun()
-    
-    # Calculate key metrics for sidebar
-    total_value = 0
-    current_daily_avg = 0
-    remaining_amount = savings_goal
-    
-    if logs:
-        # Convert to DataFrame for calculations
-        df = pd.DataFrame(logs)
-        df['date'] = pd.to_datetime(df['date'])
-        total_value = df['value'].sum()
-        remaining_amount = savings_goal - total_value
-        
-        # Calculate current daily average
-        days_with_data = (df['date'].max() - df['date'].min()).days + 1
-        current_daily_avg = total_value / max(days_with_data, 1)
+        show_habit_management(user.id, habits, metrics.daily)
     
     # Main content
     st.title("📊 Dashboard")
@@ -656,69 +1045,70 @@ def show_main_app():
         show_activity_form(user.id, habits)
         return
     
-    # Convert to DataFrame (reuse the one we already created)
-    df['category_name'] = df['categories'].apply(lambda x: x['name'] if x else 'Unknown')
-    df['category_rate'] = df['categories'].apply(lambda x: x['rate'] if x else 0)
-    
-    # Calculate totals (reuse the ones we already calculated)
-    total_hours = df['hours'].sum()
-    
     # Main metrics
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("💰 Total Pot", f"${total_value:,.2f}")
+        st.metric("💰 Total Pot", f"${metrics.total_value:,.2f}")
     
     with col2:
-        st.metric("⏱️ Total Hours", f"{total_hours:.1f}")
+        st.metric("⏱️ Total Hours", f"{metrics.total_hours:.1f}")
     
     with col3:
-        avg_rate = total_value / total_hours if total_hours > 0 else 0
-        st.metric("📈 Avg Rate", f"${avg_rate:.2f}/hr")
+        st.metric("📈 Avg Rate", f"${metrics.avg_rate:.2f}/hr")
     
     with col4:
-        progress = (total_value / savings_goal) * 100 if savings_goal > 0 else 0
-        st.metric("🎯 Goal Progress", f"{progress:.1f}%")
+        st.metric("🎯 Goal Progress", f"{metrics.progress:.1f}%")
     
+    # What the same hours are worth at past and present habit rates
+    with st.expander("💱 Pot at Historical vs Current Rates"):
+        pots = pot_under_rates(metrics.daily, data.rate_history, habits)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("As Recorded", f"${pots['recorded']:,.2f}")
+        with col2:
+            st.metric("At Historical Rates", f"${pots['historical']:,.2f}")
+        with col3:
+            st.metric("At Current Rates", f"${pots['current']:,.2f}",
+                      delta=f"{pots['current'] - pots['historical']:,.2f}")
+        st.caption("Historical rates use each habit's rate on the day an activity was logged for.")
+
+    # Totals over any date range, answered from the prefix-sum index
+    with st.expander("📆 Range Summary"):
+        today = date.today()
+        last_day = max(index.end or today, today)
+        col1, col2 = st.columns(2)
+        with col1:
+            range_from = st.date_input("From", value=last_day - timedelta(days=29), key="range_from")
+        with col2:
+            range_to = st.date_input("To", value=last_day, key="range_to")
+        range_habit = st.selectbox("Habit", ["All habits"] + [habit['name'] for habit in habits], key="range_habit")
+        range_habit_id = next((habit['id'] for habit in habits if habit['name'] == range_habit), None)
+
+        range_value, range_hours = index.total(range_from, range_to, range_habit_id)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Value", f"${range_value:,.2f}")
+        with col2:
+            st.metric("Hours", f"{range_hours:.1f}")
+        with col3:
+            st.metric("Daily Avg", f"${index.daily_average(range_from, range_to, range_habit_id):,.2f}")
+        week_value = index.last_days(7, today, range_habit_id)[0]
+        month_value = index.last_days(30, today, range_habit_id)[0]
+        st.caption(f"Last 7 days: ${week_value:,.2f} · Last 30 days: ${month_value:,.2f}")
+
     # Daily earnings and timeline metrics
     st.markdown("---")
     st.subheader("📅 Goal Timeline & Daily Targets")
     
     col1, col2, col3, col4 = st.columns(4)
     
-    # Calculate daily earnings needed using saved goal date
-    remaining_amount = savings_goal - total_value
-    
-    # Get goal date from settings
-    goal_date_str = settings.get("goal_date")
-    if goal_date_str:
-        try:
-            goal_date_from_settings = datetime.strptime(goal_date_str, "%Y-%m-%d").date()
-        except:
-            goal_date_from_settings = date(2025, 12, 31)
-    else:
-        goal_date_from_settings = date(2025, 12, 31)
-    
-    days_remaining = (goal_date_from_settings - date.today()).days
-    daily_target = remaining_amount / max(days_remaining, 1) if days_remaining > 0 else 0
-    
-    # Calculate current daily average
-    if logs:
-        days_with_data = (df['date'].max() - df['date'].min()).days + 1
-        current_daily_avg = total_value / max(days_with_data, 1)
-    else:
-        current_daily_avg = 0
-    
-    # Calculate days remaining until target goal date
-    days_to_goal = days_remaining  # This is the days until your target goal date
-    
-    # Calculate projected goal date based on current pace (for reference)
-    if current_daily_avg > 0:
-        projected_days_to_goal = remaining_amount / current_daily_avg
-        projected_goal_date = date.today() + timedelta(days=int(projected_days_to_goal))
-    else:
-        projected_days_to_goal = float('inf')
-        projected_goal_date = None
+    # Daily target and projection against the saved goal date
+    goal_date_from_settings = metrics.goal_date
+    daily_target = metrics.daily_target
+    current_daily_avg = metrics.current_daily_avg
+    days_to_goal = metrics.days_remaining
+    projected_goal_date = metrics.projected_goal_date
     
     with col1:
         st.metric(
@@ -767,9 +1157,9 @@ def show_main_app():
     
     # Progress bar
     st.subheader("🎯 Savings Goal Progress")
-    progress_value = min(total_value / savings_goal, 1.0) if savings_goal > 0 else 0
+    progress_value = min(metrics.total_value / metrics.savings_goal, 1.0) if metrics.savings_goal > 0 else 0
     st.progress(progress_value)
-    st.caption(f"${total_value:,.2f} of ${savings_goal:,.2f} ({progress:.1f}%)")
+    st.caption(f"${metrics.total_value:,.2f} of ${metrics.savings_goal:,.2f} ({metrics.progress:.1f}%)")
     
     # Weekly and Monthly breakdown
     st.markdown("---")
@@ -801,7 +1191,7 @@ def show_main_app():
         )
     
     # Motivation message
-    if remaining_amount > 0:
+    if metrics.remaining_amount > 0:
         if current_daily_avg >= daily_target:
             st.success("🎉 **You're on track to reach your goal!** Keep up the great work!")
         elif current_daily_avg > 0:
@@ -818,21 +1208,21 @@ def show_main_app():
     with col1:
         st.subheader("📈 Total Pot Over Time")
         
-        # Calculate cumulative sum
-        df_sorted = df.sort_values('date')
-        df_sorted['cumulative_value'] = df_sorted['value'].cumsum()
-        
-        fig_line = px.line(df_sorted, x='date', y='cumulative_value', 
-                          title="Cumulative Value Over Time")
-        fig_line.update_layout(xaxis_title="Date", yaxis_title="Total Value ($)")
+        # Bucketed and downsampled so long histories stay a bounded number of points
+        resolution = st.radio("Resolution", ["Auto", "Daily", "Weekly"], horizontal=True, key="chart_resolution")
+        chart_freq = {"Daily": "D", "Weekly": "W"}.get(resolution)
+        # Figures are rebuilt only when the plotted data changes
+        fig_line = cached_figure(user.id, cumulative_value_figure, cumulative_chart_data(index.daily_totals(), chart_freq))
         st.plotly_chart(fig_line, use_container_width=True)
     
     with col2:
         st.subheader("🥧 Value by Category")
         
-        category_totals = df.groupby('category_name')['value'].sum().reset_index()
-        fig_pie = px.pie(category_totals, values='value', names='category_name',
-                        title="Value Distribution by Category")
+        category_names = {habit['id']: habit['name'] for habit in habits}
+        category_totals = metrics.category_totals.assign(
+            category_name=metrics.category_totals['category_id'].map(category_names).fillna('Unknown')
+        )
+        fig_pie = cached_figure(user.id, category_value_figure, category_totals)
         st.plotly_chart(fig_pie, use_container_width=True)
     
     # Show activity logging form
@@ -841,159 +1231,7 @@ def show_main_app():
     # Recent logs table with edit functionality
     st.subheader("📋 Recent Activities")
     
-    # Display recent logs with edit/delete options
-    recent_logs = df.head(20)
-    
-    # Create a more interactive display
-    for idx, log in recent_logs.iterrows():
-        with st.expander(f"📅 {log['date'].strftime('%Y-%m-%d')} - {log['category_name']} ({log['hours']}h - ${log['value']:.2f})"):
-            col1, col2, col3 = st.columns([2, 1, 1])
-            
-            with col1:
-                st.write(f"**Hours**: {log['hours']}")
-                st.write(f"**Category**: {log['category_name']}")
-                st.write(f"**Value**: ${log['value']:.2f}")
-                if log['note']:
-                    st.write(f"**Note**: {log['note']}")
-            
-            with col2:
-                if st.button("✏️ Edit", key=f"edit_{log['id']}"):
-                    st.session_state[f"editing_{log['id']}"] = True
-            
-            with col3:
-                if st.button("🗑️ Delete", key=f"delete_{log['id']}"):
-                    if delete_log(log['id']):
-                        st.rerun()
-        
-        # Edit form (appears when edit button is clicked)
-        if st.session_state.get(f"editing_{log['id']}", False):
-            st.write("**Edit Activity:**")
-            
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                edit_date = st.date_input("Date", value=log['date'].date(), key=f"edit_date_{log['id']}")
-            
-            with col2:
-                edit_hours = st.number_input("Hours", min_value=0.1, max_value=24.0, step=0.1, 
-                                          value=float(log['hours']), key=f"edit_hours_{log['id']}")
-            
-            with col3:
-                habit_options = {habit['name']: habit['id'] for habit in habits}
-                current_category = log['category_name']
-                edit_category = st.selectbox("Category", list(habit_options.keys()), 
-                                           index=list(habit_options.keys()).index(current_category) if current_category in habit_options else 0,
-                                           key=f"edit_category_{log['id']}")
-                edit_category_id = habit_options[edit_category]
-                
-                # Show rate for selected category
-                selected_habit_data = next((h for h in habits if h['id'] == edit_category_id), None)
-                if selected_habit_data:
-                    rate = selected_habit_data['rate']
-                    rate_text = f"${rate:.2f}/hour"
-                    if rate > 0:
-                        st.success(f"💰 {rate_text}")
-                    else:
-                        st.error(f"💸 {rate_text}")
-            
-            # Real-time value calculation for edit form
-            if selected_habit_data:
-                calculated_value = edit_hours * selected_habit_data['rate']
-                value_emoji = "💰" if calculated_value > 0 else "💸"
-                
-                st.markdown("---")
-                col1, col2, col3 = st.columns([1, 2, 1])
-                with col2:
-                    if calculated_value > 0:
-                        st.success(f"**{value_emoji} New Total Value: ${calculated_value:.2f}**")
-                    else:
-                        st.error(f"**{value_emoji} New Total Value: ${calculated_value:.2f}**")
-            
-            edit_note = st.text_area("Note", value=log['note'] if log['note'] else "", 
-                                   key=f"edit_note_{log['id']}")
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("💾 Save Changes", key=f"save_{log['id']}"):
-                    if update_log(log['id'], edit_date, edit_hours, edit_category_id, edit_note):
-                        st.session_state[f"editing_{log['id']}"] = False
-                        st.rerun()
-            
-            with col2:
-                if st.button("❌ Cancel", key=f"cancel_{log['id']}"):
-                    st.session_state[f"editing_{log['id']}"] = False
-                    st.rerun()
-    
-    # Quick stats for recent activities
-    st.markdown("---")
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.metric("📊 Total Activities", len(recent_logs))
-    
-    with col2:
-        avg_hours = recent_logs['hours'].mean()
-        st.metric("⏱️ Avg Hours/Activity", f"{avg_hours:.1f}")
-    
-    with col3:
-        avg_value = recent_logs['value'].mean()
-        st.metric("💰 Avg Value/Activity", f"${avg_value:.2f}")
-    
-    # Bulk actions
-    st.markdown("---")
-    st.subheader("🔧 Bulk Actions")
-    
-    with st.expander("📊 Quick Edit Multiple Activities"):
-        st.write("Select activities to edit in bulk:")
-        
-        # Create checkboxes for each activity
-        selected_logs = []
-        habit_options = {habit['name']: habit['id'] for habit in habits}
-        
-        for idx, log in recent_logs.iterrows():
-            if st.checkbox(f"{log['date'].strftime('%Y-%m-%d')} - {log['category_name']} ({log['hours']}h)", 
-                          key=f"bulk_select_{log['id']}"):
-                selected_logs.append(log)
-        
-        if selected_logs:
-            st.write(f"**Selected {len(selected_logs)} activities**")
-            
-            with st.form("bulk_edit_form"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    bulk_hours_adjustment = st.number_input("Hours Adjustment", value=0.0, step=0.1, 
-                                                          help="Add/subtract hours from selected activities")
-                    bulk_category_change = st.selectbox("Change Category", ["Keep Current"] + list(habit_options.keys()))
-                
-                with col2:
-                    bulk_note_addition = st.text_area("Add Note", placeholder="Add this note to all selected activities")
-                    bulk_action = st.selectbox("Action", ["Adjust Hours", "Change Category", "Add Note", "Delete Selected"])
-                
-                if st.form_submit_button("🚀 Apply Bulk Changes"):
-                    success_count = 0
-                    for log in selected_logs:
-                        try:
-                            if bulk_action == "Adjust Hours":
-                                new_hours = max(0.1, float(log['hours']) + bulk_hours_adjustment)
-                                if update_log(log['id'], log['date'].date(), new_hours, log['category_id'], log['note']):
-                                    success_count += 1
-                            elif bulk_action == "Change Category" and bulk_category_change != "Keep Current":
-                                new_category_id = habit_options[bulk_category_change]
-                                if update_log(log['id'], log['date'].date(), float(log['hours']), new_category_id, log['note']):
-                                    success_count += 1
-                            elif bulk_action == "Add Note" and bulk_note_addition:
-                                new_note = f"{log['note']} {bulk_note_addition}".strip() if log['note'] else bulk_note_addition
-                                if update_log(log['id'], log['date'].date(), float(log['hours']), log['category_id'], new_note):
-                                    success_count += 1
-                            elif bulk_action == "Delete Selected":
-                                if delete_log(log['id']):
-                                    success_count += 1
-                        except Exception as e:
-                            st.error(f"Error updating activity {log['id']}: {str(e)}")
-                    
-                    st.success(f"Successfully updated {success_count} out of {len(selected_logs)} activities!")
-                    st.rerun()
+    show_recent_activities(user.id, habits)
 
 # PWA Service Worker
 def add_pwa_meta():
@@ -1009,11 +1247,18 @@ def add_pwa_meta():
 def main():
     add_pwa_meta()
     
+    # Start loading the signed-in user's data right away, but only with a
+    # session known to be valid: a stale token would fail every fetch, so
+    # otherwise show_main_app() loads after check_auth_status() refreshed it.
+    prefetch = None
+    if st.session_state.get("user_id") and session_is_fresh():
+        prefetch = DashboardLoad(st.session_state.user_id)
+    
     # Check authentication status on every page load
     if not check_auth_status():
         show_auth()
     else:
-        show_main_app()
+        show_main_app(prefetch)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+"""
+Charts for Productivity Tracker
+Resampling and Largest-Triangle-Three-Buckets downsampling, so long histories
+reach the browser as a bounded number of points that keep the line's shape,
+and a per-user cache of the Plotly figures drawn from them
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+# Most points sent to the browser for one line
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+
+# Histories longer than this are bucketed by week before downsampling
+WEEKLY_AFTER_DAYS = 730
+
+# Figures kept per user; they are shared between reruns and must not be mutated
+FIGURE_CACHE_SIZE = 8
+FIGURE_CACHE_USERS = 64
+_figure_cache = OrderedDict()  # user_id -> OrderedDict of key -> figure
+_figure_lock = threading.Lock()
+
+def resample_totals(totals: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """Bucket daily (date, value, cumulative_value) rows by day ("D") or week ("W").
+
+    Each bucket gets the value earned in it and the running total at its
+    end.
+    """
+    if totals.empty:
+        return totals
+    resampled = totals.resample(freq, on="date").agg({"value": "sum", "cumulative_value": "last"})
+    # Days without rows keep the running total of the day before
+    resampled["cumulative_value"] = resampled["cumulative_value"].ffill()
+    return resampled.reset_index()
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The points between them are
+    split into n_out - 2 buckets and each bucket keeps the point that forms
+    the largest triangle with the point kept before it and the mean of the
+    next bucket. Bucket means and the padded bucket matrix are computed up
+    front; the walk over buckets is one argmax per bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    sizes = ends - starts
+
+    # Third vertex: the next bucket's mean, or the last point for the final bucket
+    mean_x = np.add.reduceat(x[:n - 1], starts) / sizes
+    mean_y = np.add.reduceat(y[:n - 1], starts) / sizes
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    # One row per bucket, padded with the bucket's last point
+    positions = starts[:, None] + np.arange(sizes.max())[None, :]
+    positions = np.minimum(positions, (ends - 1)[:, None])
+    bucket_x = x[positions]
+    bucket_y = y[positions]
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(len(starts)):
+        area = np.abs((x[a] - next_x[b]) * (bucket_y[b] - y[a]) - (x[a] - bucket_x[b]) * (next_y[b] - y[a]))
+        a = positions[b, area.argmax()]
+        keep[b + 1] = a
+    return keep
+
+def cumulative_chart_data(totals: pd.DataFrame, freq: str = None, max_points: int = CHART_MAX_POINTS) -> pd.DataFrame:
+    """Running totals ready to plot: resampled, then downsampled to `max_points`.
+
+    `totals` holds one row per day (date, value, cumulative_value). With
+    freq=None, histories longer than WEEKLY_AFTER_DAYS are bucketed by week
+    and shorter ones by day.
+    """
+    if totals.empty:
+        return totals
+    if freq is None:
+        freq = "W" if len(totals) > WEEKLY_AFTER_DAYS else "D"
+    series = resample_totals(totals, freq)
+    x = series["date"].to_numpy(dtype="datetime64[s]").astype(np.int64).astype(float)
+    y = series["cumulative_value"].to_numpy(dtype=float)
+    return series.iloc[lttb(x, y, max_points)].reset_index(drop=True)
+
+def cumulative_value_figure(data: pd.DataFrame, title: str = "Cumulative Value Over Time"):
+    """Line chart of the running total"""
+    fig = px.line(data, x="date", y="cumulative_value", title=title)
+    fig.update_layout(xaxis_title="Date", yaxis_title="Total Value ($)")
+    return fig
+
+def category_value_figure(data: pd.DataFrame, title: str = "Value Distribution by Category"):
+    """Pie chart of value per category"""
+    return px.pie(data, values="value", names="category_name", title=title)
+
+def frame_hash(frame: pd.DataFrame) -> str:
+    """Content hash of a frame's columns and values"""
+    digest = hashlib.blake2b(repr(list(frame.columns)).encode(), digest_size=16)
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def cached_figure(user_id: str, build, data: pd.DataFrame, **options):
+    """build(data, **options), reused while the data and options are unchanged.
+
+    Figures are keyed on the builder, a hash of `data` and the options, and
+    each user keeps the FIGURE_CACHE_SIZE most recently used ones.
+    """
+    key = (build.__name__, frame_hash(data), tuple(sorted(options.items())))
+    with _figure_lock:
+        figures = _figure_cache.get(user_id)
+        if figures is not None and key in figures:
+            figures.move_to_end(key)
+            _figure_cache.move_to_end(user_id)
+            return figures[key]
+
+    figure = build(data, **options)
+    with _figure_lock:
+        figures = _figure_cache.setdefault(user_id, OrderedDict())
+        figures[key] = figure
+        while len(figures) > FIGURE_CACHE_SIZE:
+            figures.popitem(last=False)
+        _figure_cache.move_to_end(user_id)
+        while len(_figure_cache) > FIGURE_CACHE_USERS:
+            _figure_cache.popitem(last=False)
+    return figure
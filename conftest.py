@@ -0,0 +1,236 @@
+"""
+Shared pytest fixtures for Productivity Tracker
+An in-memory stand-in for the Supabase client that answers the PostgREST
+calls the storage and sync code makes, with the server-side triggers
+(value pricing, updated_at, log tombstones) and SQL functions emulated in
+Python
+"""
+
+import itertools
+import re
+from datetime import datetime, timezone
+
+import pytest
+
+CATEGORIES = [
+    {"id": 1, "name": "Work", "rate": 50.0, "description": "Focused work"},
+    {"id": 2, "name": "Social Media", "rate": -15.0, "description": "Scrolling"}
+]
+
+class FakeAPIError(Exception):
+    """Like postgrest.APIError: carries the PostgREST error code"""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+class FakeQuery:
+    """One table request, built up with the same chained calls as postgrest-py"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.columns = "*"
+        self.payload = None
+        self.filters = []
+        self.orders = []
+        self.row_limit = None
+        self.row_range = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+
+    def select(self, columns="*", **kwargs):
+        self.op, self.columns = "select", columns
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict="id", ignore_duplicates=False, **kwargs):
+        self.op, self.payload = "upsert", payload
+        self.on_conflict, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, payload, **kwargs):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self, **kwargs):
+        self.op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) > str(value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) >= str(value))
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) < str(value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) <= str(value))
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def or_(self, expression):
+        # Only the (date, id) keyset filter built by fetch_log_page()
+        last_date, last_id = re.match(r"date\.lt\.([^,]+),and\(date\.eq\.\1,id\.lt\.(\d+)\)", expression).groups()
+        last_id = int(last_id)
+        self.filters.append(lambda row: (row["date"], row["id"]) < (last_date, last_id))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.row_limit = n
+        return self
+
+    def range(self, start, end):
+        self.row_range = (start, end)
+        return self
+
+    def execute(self):
+        self.client.calls.append((self.table, self.op))
+        if self.table not in self.client.tables:
+            raise FakeAPIError(f"Could not find the table 'public.{self.table}' in the schema cache", "PGRST205")
+        rows = self.client.tables[self.table]
+        matched = [row for row in rows if all(f(row) for f in self.filters)]
+        return FakeResponse(getattr(self, f"_{self.op}")(rows, matched))
+
+    def _select(self, rows, matched):
+        for column, desc in reversed(self.orders):
+            matched.sort(key=lambda row: row.get(column), reverse=desc)
+        if self.row_range is not None:
+            matched = matched[self.row_range[0]:self.row_range[1] + 1]
+        if self.row_limit is not None:
+            matched = matched[:self.row_limit]
+        return [self.client.embed(self.table, row, self.columns) for row in matched]
+
+    def _insert(self, rows, matched):
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        written = []
+        for row in payload:
+            key = self.on_conflict if self.op == "upsert" else None
+            existing = next((r for r in rows if key and row.get(key) is not None and r.get(key) == row[key]), None)
+            if existing is None:
+                row = dict(row)
+                row.setdefault("id", next(self.client.ids))
+                self.client.on_write(self.table, row, row)
+                rows.append(row)
+                written.append(dict(row))
+            elif not self.ignore_duplicates:
+                existing.update(row)
+                self.client.on_write(self.table, existing, row)
+                written.append(dict(existing))
+        return written
+
+    _upsert = _insert
+
+    def _update(self, rows, matched):
+        for row in matched:
+            row.update(self.payload)
+            self.client.on_write(self.table, row, self.payload)
+        return [dict(row) for row in matched]
+
+    def _delete(self, rows, matched):
+        for row in matched:
+            rows.remove(row)
+            if self.table == "logs" and "log_tombstones" in self.client.tables:
+                # The record_log_tombstone trigger
+                self.client.tables["log_tombstones"].append({
+                    "log_id": row["id"], "user_id": row["user_id"], "deleted_at": self.client.timestamp()
+                })
+        return [dict(row) for row in matched]
+
+class FakeRPC:
+    """A SQL function call; runs on execute() like the real request"""
+
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.client.calls.append((self.name, "rpc"))
+        function = getattr(self.client, f"_rpc_{self.name}", None)
+        if function is None:
+            raise FakeAPIError(f"Could not find the function public.{self.name} in the schema cache", "PGRST202")
+        return FakeResponse(function(**self.params))
+
+class FakeSupabase:
+    """Tables are plain lists of dicts; `clock` stands in for the server's NOW()"""
+
+    def __init__(self, categories=CATEGORIES):
+        self.tables = {
+            "categories": [dict(c) for c in categories],
+            "logs": [],
+            "log_tombstones": [],
+            "settings": [],
+            "category_rates": []
+        }
+        self.ids = itertools.count(1000)
+        self.clock = lambda: datetime.now(timezone.utc)
+        self.calls = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRPC(self, name, params or {})
+
+    def timestamp(self) -> str:
+        return self.clock().isoformat()
+
+    def on_write(self, table, row, written):
+        """Server-side triggers: price logs from their category and stamp updated_at"""
+        if table != "logs":
+            return
+        if "hours" in written or "category_id" in written:
+            category = next(c for c in self.tables["categories"] if c["id"] == row["category_id"])
+            row["value"] = row["hours"] * category["rate"]
+        row["updated_at"] = self.timestamp()
+
+    def _rpc_revalue_category_logs(self, p_user_id, p_category_id, p_from=None, p_to=None, p_after_id=0, p_batch_size=5000):
+        """One batch of revalue_category_logs(): reprice logs whose value is off"""
+        rate = next(c["rate"] for c in self.tables["categories"] if c["id"] == p_category_id)
+        batch = sorted(
+            (row for row in self.tables["logs"]
+             if row["user_id"] == p_user_id and row["category_id"] == p_category_id and row["id"] > p_after_id
+             and (p_from is None or row["date"] >= p_from) and (p_to is None or row["date"] <= p_to)),
+            key=lambda row: row["id"]
+        )[:p_batch_size]
+        updated = [row for row in batch if row["value"] != round(row["hours"] * rate, 2)]
+        for row in updated:
+            row["value"] = round(row["hours"] * rate, 2)
+            row["updated_at"] = self.timestamp()
+        return [{"n_scanned": len(batch), "n_updated": len(updated), "last_id": batch[-1]["id"] if batch else None}]
+
+    def embed(self, table, row, columns):
+        row = dict(row)
+        if table == "logs" and "categories(" in columns:
+            row["categories"] = next((dict(c) for c in self.tables["categories"] if c["id"] == row.get("category_id")), None)
+        return row
+
+@pytest.fixture
+def supabase():
+    return FakeSupabase()
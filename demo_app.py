@@ -4,11 +4,11 @@ Simple demo version without Supabase authentication
 """
 
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, date, timedelta
 import random
+from log_records import logs_frame
 
 # Page configuration
 st.set_page_config(
@@ -59,10 +59,7 @@ def main():
     categories = get_demo_categories()
     
     # Convert to DataFrame
-    df = pd.DataFrame(logs)
-    df['date'] = pd.to_datetime(df['date'])
-    df['category_name'] = df['categories'].apply(lambda x: x['name'] if x else 'Unknown')
-    df['category_rate'] = df['categories'].apply(lambda x: x['rate'] if x else 0)
+    df = logs_frame(logs)
     
     # Calculate totals
     total_value = df['value'].sum()
@@ -116,7 +116,7 @@ def check_existing_instance():
     
     return False
 
-def start_streamlit():
+def start_streamlit(local: bool = False):
     """Start Streamlit server with safety checks"""
     global streamlit_process
     
@@ -126,13 +126,18 @@ def start_streamlit():
             print("⚠️ Port 8501 is already in use. Using existing server...")
             return
         
+        env = os.environ.copy()
+        if local:
+            # Keep all data in a SQLite file on this machine
+            env["STORAGE_BACKEND"] = "sqlite"
+        
         # Start Streamlit server
         streamlit_process = subprocess.Popen([
             sys.executable, "-m", "streamlit", "run", "app.py",
             "--server.port", "8501", "--server.headless", "true",
             "--server.enableCORS", "false",
             "--server.enableXsrfProtection", "false"
-        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
         
         print("🚀 Streamlit server starting...")
         
@@ -153,8 +158,12 @@ def main():
     # Default URL - change this to your deployed URL
     URL = "http://localhost:8501"  # Change to your Streamlit Cloud URL
     
+    local = "--local" in sys.argv[1:]
+    
     print("🚀 Launching Productivity Tracker Desktop App - Safe Version...")
     print(f"📱 URL: {URL}")
+    if local:
+        print("💾 Local mode: data is stored in a SQLite database on this machine")
     
     # Check if another instance is already running
     if check_existing_instance():
@@ -192,7 +201,7 @@ def main():
         print("✅ Streamlit server already running, connecting to existing instance...")
     else:
         # Start Streamlit server
-        start_streamlit()
+        start_streamlit(local)
     
     try:
         webview.create_window(
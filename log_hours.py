@@ -10,6 +10,7 @@ from datetime import datetime, date
 from dotenv import load_dotenv
 from supabase import create_client, Client
 import sys
+from log_sync import LogSnapshot, load_snapshot, save_snapshot
 
 # Load environment variables
 load_dotenv()
@@ -52,24 +53,14 @@ def authenticate_user(supabase: Client, email: str, password: str):
         return None
 
 def log_activity(supabase: Client, user_id: str, log_date: date, hours: float, category_id: int, note: str = ""):
-    """Log activity to database"""
+    """Log activity to database; the value is set from the category rate by a trigger"""
     try:
-        # Get category rate to calculate value
-        category_response = supabase.table("categories").select("rate").eq("id", category_id).execute()
-        if not category_response.data:
-            print("Category not found")
-            return None
-        
-        rate = category_response.data[0]['rate']
-        value = hours * rate
-        
         response = supabase.table("logs").insert({
             "user_id": user_id,
             "date": log_date.isoformat(),
             "hours": hours,
             "category_id": category_id,
-            "note": note,
-            "value": value
+            "note": note
         }).execute()
         
         if response.data:
@@ -81,6 +72,15 @@ def log_activity(supabase: Client, user_id: str, log_date: date, hours: float, c
         print(f"Error logging activity: {str(e)}")
         return None
 
+def update_local_snapshot(supabase: Client, user_id: str):
+    """Bring an existing on-disk log snapshot up to date so the app starts from fresh data"""
+    try:
+        snapshot = load_snapshot(user_id)
+        if snapshot is not None and snapshot.sync(supabase):
+            save_snapshot(snapshot)
+    except Exception as e:
+        print(f"Could not update local snapshot: {str(e)}")
+
 @click.command()
 @click.option('--hours', '-h', required=True, type=float, help='Number of hours worked')
 @click.option('--category', '-c', required=True, help='Category name (work, personal, etc.)')
@@ -138,21 +138,15 @@ def log_hours(hours, category, note, date, email, password):
     result = log_activity(supabase, user_id, log_date, hours, category_id, note)
     
     if result:
-        # Get category rate for display
-        try:
-            cat_response = supabase.table("categories").select("rate").eq("id", category_id).execute()
-            rate = cat_response.data[0]['rate'] if cat_response.data else 0
-            value = hours * rate
-            
-            print(f"✅ Activity logged successfully!")
-            print(f"   Date: {log_date}")
-            print(f"   Hours: {hours}")
-            print(f"   Category: {category}")
-            print(f"   Value: ${value:.2f}")
-            if note:
-                print(f"   Note: {note}")
-        except Exception as e:
-            print(f"Activity logged, but couldn't fetch rate: {str(e)}")
+        update_local_snapshot(supabase, user_id)
+        
+        print("✅ Activity logged successfully!")
+        print(f"   Date: {log_date}")
+        print(f"   Hours: {hours}")
+        print(f"   Category: {category}")
+        print(f"   Value: ${float(result['value']):.2f}")
+        if note:
+            print(f"   Note: {note}")
     else:
         print("❌ Failed to log activity")
 
@@ -184,6 +178,53 @@ def list_categories(email, password):
     except Exception as e:
         print(f"Error fetching categories: {str(e)}")
 
+@click.command()
+@click.option('--email', '-e', help='Your email for authentication')
+@click.option('--password', '-p', help='Your password for authentication')
+def stats(email, password):
+    """Show your totals from the local log snapshot, synced with Supabase"""
+    
+    # Initialize Supabase
+    supabase = init_supabase()
+    
+    # Get authentication credentials
+    if not email:
+        email = click.prompt('Email')
+    if not password:
+        password = click.prompt('Password', hide_input=True)
+    
+    # Authenticate user
+    user_id = authenticate_user(supabase, email, password)
+    if not user_id:
+        return
+    
+    # Start from the on-disk snapshot and only fetch what changed since
+    try:
+        snapshot = load_snapshot(user_id) or LogSnapshot(user_id)
+        if snapshot.sync(supabase):
+            save_snapshot(snapshot)
+    except Exception as e:
+        print(f"Error syncing logs: {str(e)}")
+        return
+    
+    logs = snapshot.rows()
+    if not logs:
+        print("No logs found.")
+        return
+    
+    totals = {}
+    for log in logs:
+        name = (log.get('categories') or {}).get('name') or 'Unknown'
+        hours_total, value_total = totals.get(name, (0.0, 0.0))
+        totals[name] = (hours_total + float(log['hours']), value_total + float(log['value']))
+    
+    print(f"{len(logs)} activities from {logs[-1]['date']} to {logs[0]['date']}")
+    print("-" * 50)
+    for name, (hours_total, value_total) in sorted(totals.items()):
+        print(f"{name:20} {hours_total:>8.1f}h ${value_total:>10.2f}")
+    print("-" * 50)
+    print(f"{'Total':20} {sum(h for h, _ in totals.values()):>8.1f}h ${sum(v for _, v in totals.values()):>10.2f}")
+
 @click.group()
 def cli():
     """Productivity Tracker CLI"""
@@ -191,6 +232,7 @@ def cli():
 
 cli.add_command(log_hours)
 cli.add_command(list_categories)
+cli.add_command(stats)
 
 if __name__ == '__main__':
     cli()
@@ -0,0 +1,148 @@
+"""
+Compact log records for Productivity Tracker
+Log rows held column by column in small fixed-width NumPy arrays instead of
+one dict per row, so cached pages take a fraction of the memory and can be
+handed to pandas without copying
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+HOURS_SCALE = 100  # hours are DECIMAL(5,2): stored as hundredths of an hour
+VALUE_SCALE = 100  # values are DECIMAL(10,2): stored as cents
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+UNKNOWN_CATEGORY = "Unknown"
+
+class LogRecords:
+    """Column store of logs as returned by select("*, categories(*)").
+
+    Per row it keeps an int64 id, the date as an int32 day ordinal, hours
+    and value as fixed-point integers and the category as an int16 code
+    into a small table of the distinct categories. Notes stay Python
+    strings. view() shares the arrays with pandas; to_frame() decodes.
+    """
+    __slots__ = ("id", "date_ordinal", "hours_centi", "value_cents", "category_code", "note", "categories")
+
+    def __init__(self, id, date_ordinal, hours_centi, value_cents, category_code, note, categories):
+        self.id = id
+        self.date_ordinal = date_ordinal
+        self.hours_centi = hours_centi
+        self.value_cents = value_cents
+        self.category_code = category_code
+        self.note = note
+        self.categories = categories  # tuple of (category_id, name, rate), indexed by code
+
+    @classmethod
+    def from_rows(cls, logs: list) -> "LogRecords":
+        n = len(logs)
+        # The join embeds the same few category dicts in every row; each
+        # distinct one is decoded once and rows only keep its code
+        categories = []
+        codes_by_id = {}
+        for log in logs:
+            category = log.get("categories")
+            if category and category["id"] not in codes_by_id:
+                codes_by_id[category["id"]] = len(categories)
+                categories.append((category["id"], category["name"], float(category["rate"])))
+        # Logs without a category share the "Unknown" entry, reusing a
+        # real category of that name so the Categorical stays unique
+        unknown = next((code for code, (_, name, _) in enumerate(categories) if name == UNKNOWN_CATEGORY), None)
+
+        category_code = np.empty(n, dtype=np.int16)
+        for i, log in enumerate(logs):
+            code = codes_by_id.get(_category_id(log))
+            if code is None:
+                if unknown is None:
+                    unknown = len(categories)
+                    categories.append((-1, UNKNOWN_CATEGORY, 0.0))
+                code = unknown
+            category_code[i] = code
+
+        return cls(
+            id=np.fromiter((log["id"] for log in logs), dtype=np.int64, count=n),
+            date_ordinal=np.fromiter((_date_ordinal(log["date"]) for log in logs), dtype=np.int32, count=n),
+            hours_centi=np.fromiter((round(float(log["hours"]) * HOURS_SCALE) for log in logs), dtype=np.int32, count=n),
+            value_cents=np.fromiter((round(float(log["value"]) * VALUE_SCALE) for log in logs), dtype=np.int64, count=n),
+            category_code=category_code,
+            note=[log.get("note") for log in logs],
+            categories=tuple(categories)
+        )
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def view(self) -> pd.DataFrame:
+        """The raw columns as a DataFrame that shares memory with the arrays"""
+        return pd.DataFrame({
+            "id": self.id,
+            "date_ordinal": self.date_ordinal,
+            "hours_centi": self.hours_centi,
+            "value_cents": self.value_cents,
+            "category_code": self.category_code
+        }, copy=False)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Decoded frame: datetime dates, float hours and values, categorical names"""
+        category_ids, names, rates = zip(*self.categories) if self.categories else ((), (), ())
+        codes = self.category_code
+        return pd.DataFrame({
+            "id": self.id,
+            "date": (self.date_ordinal - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[s]"),
+            "hours": self.hours_centi / HOURS_SCALE,
+            "value": self.value_cents / VALUE_SCALE,
+            "category_id": np.asarray(category_ids, dtype=np.int64)[codes],
+            "category_name": pd.Categorical.from_codes(codes, categories=names),
+            "category_rate": np.asarray(rates, dtype=np.float64)[codes],
+            "note": self.note
+        })
+
+def logs_frame(logs: list) -> pd.DataFrame:
+    """Decoded frame of logs as returned by select("*, categories(*)")"""
+    return LogRecords.from_rows(logs).to_frame()
+
+def diff_log_edits(original: pd.DataFrame, edited: pd.DataFrame, habit_ids: dict):
+    """Compare the Recent Activities grid before and after editing.
+
+    Returns the rows to write back, as bulk_update_logs() expects them, the
+    ids of the rows marked for deletion and the ids of edited rows that
+    cannot be saved because their habit is unknown. A row whose habit was
+    not changed keeps its original category_id. Unchanged rows are left out.
+    """
+    deleted = edited["delete"].to_numpy(dtype=bool)
+    same_category = (edited["category_name"] == original["category_name"]).to_numpy()
+    changed = (
+        (edited["date"] != original["date"]).to_numpy()
+        | ~np.isclose(edited["hours"].to_numpy(dtype=float), original["hours"].to_numpy(dtype=float))
+        | ~same_category
+        | (edited["note"].fillna("") != original["note"].fillna("")).to_numpy()
+    ) & ~deleted
+
+    updates, unknown = [], []
+    rows = edited[changed].fillna({"note": ""}).itertuples(index=False)
+    for row, keep, original_id in zip(rows, same_category[changed], original["category_id"].to_numpy()[changed]):
+        category_id = original_id if keep else habit_ids.get(row.category_name)
+        # Logs of a habit missing from the page's categories come back with id -1
+        if category_id is None or category_id < 0:
+            unknown.append(int(row.id))
+            continue
+        updates.append({
+            "id": int(row.id),
+            "date": row.date,
+            "hours": float(row.hours),
+            "category_id": int(category_id),
+            "note": row.note
+        })
+    return updates, edited.loc[deleted, "id"].astype(int).tolist(), unknown
+
+def _category_id(log: dict):
+    category_id = log.get("category_id")
+    if category_id is None and log.get("categories"):
+        category_id = log["categories"]["id"]
+    return category_id
+
+def _date_ordinal(value) -> int:
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.toordinal()
@@ -0,0 +1,346 @@
+"""
+Incremental log sync for Productivity Tracker
+Keeps a local copy of a user's logs and only fetches what changed since the
+last sync, using logs.updated_at and the log_tombstones table for deletions
+"""
+
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # on-disk snapshots are an optional speed-up
+    pa = None
+    pq = None
+
+PAGE_SIZE = 1000  # PostgREST's default max rows per request
+
+# Timestamps come from NOW() at transaction start, so a row committed just
+# after a sync can carry a slightly older updated_at. Re-reading a short
+# window behind the high-water mark picks those rows up; merging is by id,
+# so seeing a row twice is harmless.
+SYNC_OVERLAP = timedelta(seconds=30)
+
+# Tombstones older than this may be pruned on the server; a snapshot that has
+# not synced for that long reloads from scratch instead of trusting deltas.
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+# PostgREST / Postgres error codes for a table that does not exist
+MISSING_TABLE_CODES = ("PGRST205", "42P01")
+
+# Per-user Parquet snapshots live here, so a restarted process only syncs
+# what changed instead of reloading every log. The app's dashboard does not
+# read them: it renders from daily_rollups and one page of logs; snapshots
+# back full-history reads (the rollup fallback, `log_hours.py stats`).
+CACHE_DIR = os.getenv(
+    "PRODUCTIVITY_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "productivity-tracker")
+)
+
+def fetch_log_page(supabase, user_id: str, page_size: int = PAGE_SIZE, after: tuple = None) -> list:
+    """One page of a user's logs newest first, after the (date, id) keyset cursor `after`"""
+    query = supabase.table("logs").select("*, categories(*)").eq("user_id", user_id)
+    if after is not None:
+        last_date, last_id = after
+        query = query.or_(f"date.lt.{last_date},and(date.eq.{last_date},id.lt.{last_id})")
+    return query.order("date", desc=True).order("id", desc=True).limit(page_size).execute().data
+
+def iter_log_pages(supabase, user_id: str, page_size: int = PAGE_SIZE):
+    """Yield a user's logs newest first, one page at a time.
+
+    Pages are keyset-paginated on (date, id), so each request seeks straight
+    to the next page through the (user_id, date, id) index instead of
+    scanning past an offset, and callers can aggregate incrementally.
+    """
+    after = None
+    while True:
+        page = fetch_log_page(supabase, user_id, page_size, after)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = (page[-1]["date"], page[-1]["id"])
+
+def is_missing_table(error: Exception) -> bool:
+    """Whether a PostgREST error says the queried table does not exist"""
+    return getattr(error, "code", None) in MISSING_TABLE_CODES
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse a PostgREST timestamptz string.
+
+    Postgres trims trailing zeros from fractional seconds, which
+    datetime.fromisoformat() does not accept before Python 3.11.
+    """
+    value = value.replace("Z", "+00:00")
+    match = re.match(r"^(\d{4}-\d{2}-\d{2}[T ][\d:]+)(?:\.(\d+))?(.*)$", value)
+    if match:
+        base, fraction, offset = match.groups()
+        value = f"{base}.{(fraction or '0')[:6].ljust(6, '0')}{offset}"
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def format_timestamp(value: datetime) -> str:
+    return value.astimezone(timezone.utc).isoformat()
+
+class LogSnapshot:
+    """Local copy of one user's logs plus the high-water marks of the last sync"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.logs = {}  # log id -> row as returned by select("*, categories(*)")
+        self.updated_mark = None  # newest logs.updated_at seen
+        self.deleted_mark = None  # newest log_tombstones.deleted_at seen
+        self.synced_at = None
+        # Whether log_tombstones was readable at the last full load; None
+        # (never loaded, or an older snapshot file) forces a full load
+        self.has_tombstones = None
+        self._lock = threading.Lock()
+
+    def rows(self) -> list:
+        """All logs, newest first (same order as iter_log_pages)"""
+        return sorted(self.logs.values(), key=lambda row: (row["date"], row["id"]), reverse=True)
+
+    def is_loaded(self) -> bool:
+        return self.synced_at is not None
+
+    def is_stale(self, max_age: timedelta) -> bool:
+        return not self.is_loaded() or datetime.now(timezone.utc) - self.synced_at > max_age
+
+    def sync(self, supabase, blocking: bool = True) -> int:
+        """Bring the snapshot up to date and return the number of rows changed.
+
+        With blocking=False the call returns 0 straight away if another
+        thread is already syncing this snapshot.
+        """
+        if not self._lock.acquire(blocking):
+            return 0
+        try:
+            now = datetime.now(timezone.utc)
+            # Deletions can only be synced as deltas through log_tombstones
+            if not self.is_loaded() or not self.has_tombstones or now - self.synced_at > TOMBSTONE_RETENTION:
+                changed = self._load(supabase)
+            else:
+                try:
+                    changed = self._apply_changes(supabase)
+                except Exception as e:
+                    if not is_missing_table(e):
+                        raise
+                    changed = self._load(supabase)
+            self.synced_at = now
+            return changed
+        finally:
+            self._lock.release()
+
+    def is_syncing(self) -> bool:
+        return self._lock.locked()
+
+    # Both sync paths fill a new dict and swap it in at the end, so readers
+    # calling rows() meanwhile see the previous complete copy, and a failed
+    # sync leaves the snapshot as it was.
+
+    def _load(self, supabase) -> int:
+        # Read the tombstone mark first so deletions made during the load are
+        # still picked up by the next delta
+        try:
+            deleted_mark = self._latest_tombstone(supabase)
+            has_tombstones = True
+        except Exception as e:
+            if not is_missing_table(e):
+                raise
+            deleted_mark = None
+            has_tombstones = False
+        logs = {}
+        updated_mark = None
+        for page in iter_log_pages(supabase, self.user_id):
+            updated_mark = self._merge(logs, page, updated_mark)[1]
+        self.logs, self.updated_mark, self.deleted_mark = logs, updated_mark, deleted_mark
+        self.has_tombstones = has_tombstones
+        return len(logs)
+
+    def _apply_changes(self, supabase) -> int:
+        logs = dict(self.logs)
+        updated_mark = self.updated_mark
+        changed = 0
+
+        if updated_mark is not None:
+            since = format_timestamp(parse_timestamp(updated_mark) - SYNC_OVERLAP)
+            def changed_logs():
+                return supabase.table("logs").select("*, categories(*)").eq("user_id", self.user_id).gte("updated_at", since).order("updated_at").order("id")
+            pages = self._pages(changed_logs)
+        else:
+            # Nothing was there at the last load; anything present now is new
+            pages = iter_log_pages(supabase, self.user_id)
+        for page in pages:
+            merged, updated_mark = self._merge(logs, page, updated_mark)
+            changed += merged
+
+        deleted_mark = self.deleted_mark
+        since = None
+        if deleted_mark is not None:
+            since = format_timestamp(parse_timestamp(deleted_mark) - SYNC_OVERLAP)
+        def tombstones():
+            query = supabase.table("log_tombstones").select("log_id, deleted_at").eq("user_id", self.user_id)
+            if since is not None:
+                query = query.gte("deleted_at", since)
+            return query.order("deleted_at").order("log_id")
+        for page in self._pages(tombstones):
+            for tombstone in page:
+                row = logs.get(tombstone["log_id"])
+                # A row written again after its deletion (e.g. a bulk upsert) stays
+                if row is not None and not self._is_newer(row.get("updated_at"), tombstone["deleted_at"]):
+                    del logs[tombstone["log_id"]]
+                    changed += 1
+                deleted_mark = self._latest(deleted_mark, tombstone["deleted_at"])
+
+        self.logs, self.updated_mark, self.deleted_mark = logs, updated_mark, deleted_mark
+        return changed
+
+    def _merge(self, logs: dict, rows: list, updated_mark) -> tuple:
+        """Merge rows into `logs` by id; returns (rows changed, new updated_at mark)"""
+        changed = 0
+        for row in rows:
+            if logs.get(row["id"]) != row:
+                logs[row["id"]] = row
+                changed += 1
+            updated_mark = self._latest(updated_mark, row.get("updated_at"))
+        return changed, updated_mark
+
+    def _latest_tombstone(self, supabase):
+        response = supabase.table("log_tombstones").select("deleted_at").eq("user_id", self.user_id).order("deleted_at", desc=True).limit(1).execute()
+        return response.data[0]["deleted_at"] if response.data else None
+
+    @staticmethod
+    def _pages(make_query):
+        """Offset-page a query built fresh by `make_query` for each request"""
+        offset = 0
+        while True:
+            response = make_query().range(offset, offset + PAGE_SIZE - 1).execute()
+            if response.data:
+                yield response.data
+            if len(response.data) < PAGE_SIZE:
+                return
+            offset += PAGE_SIZE
+
+    @staticmethod
+    def _is_newer(a, b) -> bool:
+        return a is not None and b is not None and parse_timestamp(a) > parse_timestamp(b)
+
+    @classmethod
+    def _latest(cls, current, candidate):
+        if candidate is None:
+            return current
+        if current is None or cls._is_newer(candidate, current):
+            return candidate
+        return current
+
+
+# On-disk snapshots: one Parquet file per user. Rows are stored flat with the
+# embedded category unpacked into columns; the sync marks go in the file's
+# schema metadata.
+if pa is not None:
+    SNAPSHOT_SCHEMA = pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.string()),
+        ("date", pa.date32()),
+        ("hours", pa.float64()),
+        ("value", pa.float64()),
+        ("category_id", pa.int64()),
+        ("note", pa.string()),
+        ("client_id", pa.string()),
+        ("created_at", pa.string()),
+        ("updated_at", pa.string()),
+        ("category_name", pa.string()),
+        ("category_rate", pa.float64()),
+        ("category_description", pa.string())
+    ])
+
+def snapshot_path(user_id: str, cache_dir: str = None) -> str:
+    safe_user_id = re.sub(r"[^A-Za-z0-9_-]", "_", user_id)
+    return os.path.join(cache_dir or CACHE_DIR, f"logs-{safe_user_id}.parquet")
+
+def delete_snapshots(cache_dir: str = None) -> int:
+    """Remove every user's snapshot file; returns the number removed"""
+    directory = cache_dir or CACHE_DIR
+    removed = 0
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if name.startswith("logs-") and name.endswith(".parquet"):
+            try:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+def save_snapshot(snapshot: LogSnapshot, cache_dir: str = None) -> bool:
+    """Write the snapshot to its Parquet file; returns False if pyarrow is missing"""
+    if pa is None or not snapshot.is_loaded():
+        return False
+
+    rows = []
+    for row in snapshot.logs.values():
+        category = row.get("categories") or {}
+        rows.append({
+            "id": row["id"],
+            "user_id": row.get("user_id"),
+            "date": date.fromisoformat(row["date"]),
+            "hours": float(row["hours"]),
+            "value": float(row["value"]),
+            "category_id": row.get("category_id"),
+            "note": row.get("note"),
+            "client_id": row.get("client_id"),
+            "created_at": row.get("created_at"),
+            "updated_at": row.get("updated_at"),
+            "category_name": category.get("name"),
+            "category_rate": float(category["rate"]) if category.get("rate") is not None else None,
+            "category_description": category.get("description")
+        })
+    metadata = {
+        "updated_mark": snapshot.updated_mark or "",
+        "deleted_mark": snapshot.deleted_mark or "",
+        "has_tombstones": "1" if snapshot.has_tombstones else "0",
+        "synced_at": format_timestamp(snapshot.synced_at)
+    }
+    table = pa.Table.from_pylist(rows, schema=SNAPSHOT_SCHEMA).replace_schema_metadata(metadata)
+
+    path = snapshot_path(snapshot.user_id, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first so readers never see a partial snapshot
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return True
+
+def load_snapshot(user_id: str, cache_dir: str = None):
+    """Read a user's snapshot from disk, or return None if there is none"""
+    path = snapshot_path(user_id, cache_dir)
+    if pa is None or not os.path.exists(path):
+        return None
+
+    # Memory-mapped so the file's pages are read straight from the OS cache
+    table = pq.read_table(path, memory_map=True)
+    metadata = {key.decode(): value.decode() for key, value in (table.schema.metadata or {}).items()}
+
+    snapshot = LogSnapshot(user_id)
+    for row in table.to_pylist():
+        category_id = row.pop("category_id")
+        category = {
+            "id": category_id,
+            "name": row.pop("category_name"),
+            "rate": row.pop("category_rate"),
+            "description": row.pop("category_description")
+        }
+        row["date"] = row["date"].isoformat()
+        row["category_id"] = category_id
+        row["categories"] = category if category_id is not None else None
+        snapshot.logs[row["id"]] = row
+    snapshot.updated_mark = metadata.get("updated_mark") or None
+    snapshot.deleted_mark = metadata.get("deleted_mark") or None
+    if "has_tombstones" in metadata:
+        snapshot.has_tombstones = metadata["has_tombstones"] == "1"
+    snapshot.synced_at = parse_timestamp(metadata["synced_at"])
+    return snapshot
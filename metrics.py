@@ -0,0 +1,325 @@
+"""
+Analytics for Productivity Tracker
+Vectorized computations over the per-day, per-category rollups that feed the
+dashboard
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+DAILY_COLUMNS = ["date", "category_id", "hours", "value", "n_logs"]
+
+# Results are shared by every session on the server and must not be mutated
+METRICS_CACHE_SIZE = 64
+_metrics_cache = OrderedDict()
+_metrics_lock = threading.Lock()
+
+# Per-user prefix-sum indexes, updated in place as the user's rollups change
+_user_indexes = OrderedDict()
+_index_lock = threading.Lock()
+
+class DashboardMetrics(NamedTuple):
+    """Every figure the dashboard shows, computed from one typed frame"""
+    daily: pd.DataFrame  # one row per day and category
+    category_totals: pd.DataFrame  # category_id, value
+    total_value: float
+    total_hours: float
+    avg_rate: float
+    days_with_data: int
+    current_daily_avg: float
+    savings_goal: float
+    remaining_amount: float
+    progress: float  # percent of the savings goal
+    goal_date: date
+    days_remaining: int
+    daily_target: float
+    projected_goal_date: Optional[date]
+
+class PrefixIndex:
+    """Prefix sums of daily value and hours, one row per category plus a total.
+
+    Column i holds the sums over the days before `start + i`, so the total
+    over any date range is the difference of two columns and costs the same
+    whatever the length of the history. The last row is the total over all
+    categories.
+    """
+
+    def __init__(self, start: date = None, category_ids: list = ()):
+        self.start = start
+        self.days = 0  # days covered, from start
+        self.rows = {category_id: row for row, category_id in enumerate(category_ids)}
+        self._value = np.zeros((len(self.rows) + 1, 1))
+        self._hours = np.zeros((len(self.rows) + 1, 1))
+
+    @classmethod
+    def from_daily(cls, daily: pd.DataFrame) -> "PrefixIndex":
+        """Build the index from a typed daily frame in one pass"""
+        index = cls()
+        index.replace_from(None, daily)
+        return index
+
+    def replace_from(self, day: Optional[date], daily: pd.DataFrame):
+        """Recompute every column from `day` onward out of `daily`.
+
+        `daily` must hold all rows dated `day` or later (and may hold no
+        earlier ones). Columns before `day` are kept, so the work is
+        proportional to the rebuilt suffix; day=None rebuilds everything.
+        """
+        if day is None or self.start is None or day <= self.start:
+            self.__init__()
+            if daily.empty:
+                return
+            self.start = daily["date"].min().date()
+            day = self.start
+        column = (day - self.start).days
+        self.days = min(self.days, column)
+        if daily.empty:
+            return
+
+        category_ids = daily["category_id"].to_numpy()
+        for category_id in np.unique(category_ids).tolist():
+            if category_id not in self.rows:
+                self._add_category(category_id)
+        last = (daily["date"].max().date() - self.start).days
+        self._grow_right(last + 1)
+
+        rows = daily["category_id"].map(self.rows).to_numpy(dtype=np.int64)
+        days = (daily["date"].dt.normalize() - pd.Timestamp(day)).dt.days.to_numpy()
+        for sums, column_name in ((self._value, "value"), (self._hours, "hours")):
+            increments = np.zeros((sums.shape[0], last - column + 1))
+            np.add.at(increments, (rows, days), daily[column_name].to_numpy(dtype=float))
+            increments[-1] = increments[:-1].sum(axis=0)
+            sums[:, column + 1:last + 2] = sums[:, column:column + 1] + np.cumsum(increments, axis=1)
+
+    def total(self, date_from: date = None, date_to: date = None, category_id: int = None) -> tuple:
+        """(value, hours) from date_from to date_to inclusive; open ends cover the whole history"""
+        row = -1 if category_id is None else self.rows.get(category_id)
+        if self.start is None or row is None:
+            return 0.0, 0.0
+        lo = self._column(date_from, 0)
+        hi = self._column(date_to + timedelta(days=1) if date_to else None, self.days)
+        if hi <= lo:
+            return 0.0, 0.0
+        return (float(self._value[row, hi] - self._value[row, lo]),
+                float(self._hours[row, hi] - self._hours[row, lo]))
+
+    def daily_average(self, date_from: date, date_to: date, category_id: int = None) -> float:
+        """Average value per calendar day from date_from to date_to inclusive"""
+        n_days = (date_to - date_from).days + 1
+        return self.total(date_from, date_to, category_id)[0] / n_days if n_days > 0 else 0.0
+
+    def last_days(self, n: int, today: date, category_id: int = None) -> tuple:
+        """(value, hours) over the n days ending today"""
+        return self.total(today - timedelta(days=n - 1), today, category_id)
+
+    def daily_totals(self) -> pd.DataFrame:
+        """Every day from start to end with its total value and the running total"""
+        cumulative = self._value[-1, :self.days + 1]
+        return pd.DataFrame({
+            "date": pd.date_range(self.start, periods=self.days) if self.days else pd.DatetimeIndex([]),
+            "value": np.diff(cumulative),
+            "cumulative_value": cumulative[1:]
+        })
+
+    @property
+    def end(self) -> Optional[date]:
+        """Last day covered"""
+        return self.start + timedelta(days=self.days - 1) if self.days else None
+
+    def _column(self, day: Optional[date], default: int) -> int:
+        if day is None:
+            return default
+        return min(max((day - self.start).days, 0), self.days)
+
+    def _grow_right(self, days: int):
+        # Capacity doubles so appending day after day stays amortized O(1)
+        capacity = self._value.shape[1] - 1
+        if days > capacity:
+            extra = np.empty((self._value.shape[0], max(days, 2 * capacity) - capacity))
+            self._value = np.hstack([self._value, extra])
+            self._hours = np.hstack([self._hours, extra])
+        # Nothing was logged on the new days, so their prefixes carry over
+        self._value[:, self.days + 1:days + 1] = self._value[:, self.days:self.days + 1]
+        self._hours[:, self.days + 1:days + 1] = self._hours[:, self.days:self.days + 1]
+        self.days = days
+
+    def _add_category(self, category_id: int) -> int:
+        row = len(self.rows)
+        self.rows[category_id] = row
+        self._value = np.insert(self._value, row, 0.0, axis=0)
+        self._hours = np.insert(self._hours, row, 0.0, axis=0)
+        return row
+
+def rows_hash(rows: list) -> str:
+    """Content hash of a list of rows, used as the memo key"""
+    return hashlib.blake2b(repr(rows).encode(), digest_size=16).hexdigest()
+
+def daily_frame(daily_rollups: list) -> pd.DataFrame:
+    """Typed frame of per-day, per-category rollup rows"""
+    frame = pd.DataFrame(daily_rollups, columns=DAILY_COLUMNS)
+    frame = frame.astype({"category_id": "int64", "hours": "float64", "value": "float64", "n_logs": "int64"})
+    frame["date"] = pd.to_datetime(frame["date"])
+    return frame
+
+def dashboard_metrics(daily_rollups: list, savings_goal: float, goal_date: date, today: date = None,
+                      summary: list = None) -> DashboardMetrics:
+    """Compute the dashboard figures, memoized on the rollups and goal.
+
+    When `summary` (get_user_log_summary() rows) is given, the headline
+    totals and goal figures come from it and the day buckets only feed
+    the charts. Reruns that did not change the data get the previous
+    result back without rebuilding the frame.
+    """
+    today = today or date.today()
+    key = (rows_hash(daily_rollups), rows_hash(summary or []), savings_goal, goal_date, today)
+    with _metrics_lock:
+        if key in _metrics_cache:
+            _metrics_cache.move_to_end(key)
+            return _metrics_cache[key]
+
+    metrics = _compute_metrics(daily_frame(daily_rollups), savings_goal, goal_date, today, summary)
+    with _metrics_lock:
+        _metrics_cache[key] = metrics
+        while len(_metrics_cache) > METRICS_CACHE_SIZE:
+            _metrics_cache.popitem(last=False)
+    return metrics
+
+def user_index(user_id: str, daily: pd.DataFrame) -> PrefixIndex:
+    """The user's prefix-sum index, brought up to date with `daily`.
+
+    The index is kept between calls and compared with the rows it was
+    last built from: unchanged rows (the same memoized frame) cost
+    nothing, and otherwise only the days from the first changed row
+    onward are rebuilt. A log appended on the latest day therefore
+    rebuilds one column.
+    """
+    with _index_lock:
+        entry = _user_indexes.get(user_id)
+        if entry is None:
+            index = PrefixIndex.from_daily(daily)
+        else:
+            previous, index = entry
+            if daily is not previous:
+                day = _first_changed_day(previous, daily)
+                if day is not None:
+                    if not daily["date"].is_monotonic_increasing:
+                        index.replace_from(None, daily)
+                    else:
+                        start = np.searchsorted(daily["date"].to_numpy(), np.datetime64(day), side="left")
+                        index.replace_from(day, daily.iloc[start:])
+        _user_indexes[user_id] = (daily, index)
+        _user_indexes.move_to_end(user_id)
+        while len(_user_indexes) > METRICS_CACHE_SIZE:
+            _user_indexes.popitem(last=False)
+        return index
+
+def _first_changed_day(previous: pd.DataFrame, daily: pd.DataFrame) -> Optional[date]:
+    """Earliest date whose rows differ between two daily frames, or None if they match"""
+    n = min(len(previous), len(daily))
+    differs = np.zeros(n, dtype=bool)
+    for column in ("date", "category_id", "hours", "value"):
+        differs |= previous[column].to_numpy()[:n] != daily[column].to_numpy()[:n]
+    changed = np.flatnonzero(differs)
+    if len(changed):
+        row = changed[0]
+        return min(previous["date"].iloc[row], daily["date"].iloc[row]).date()
+    if len(previous) == len(daily):
+        return None
+    longer = previous if len(previous) > n else daily
+    return longer["date"].iloc[n].date()
+
+def _compute_metrics(daily: pd.DataFrame, savings_goal: float, goal_date: date, today: date,
+                     summary: list = None) -> DashboardMetrics:
+    if summary:
+        totals = pd.DataFrame(summary)
+        total_value = float(totals["total_value"].astype(float).sum())
+        total_hours = float(totals["total_hours"].astype(float).sum())
+        first_date = pd.to_datetime(totals["first_date"]).min()
+        last_date = pd.to_datetime(totals["last_date"]).max()
+        days_with_data = (last_date - first_date).days + 1
+        category_totals = pd.DataFrame({
+            "category_id": totals["category_id"],
+            "value": totals["total_value"].astype(float)
+        }).sort_values("category_id", ignore_index=True)
+    else:
+        total_value = float(daily["value"].sum())
+        total_hours = float(daily["hours"].sum())
+        days_with_data = 0
+        if not daily.empty:
+            days_with_data = (daily["date"].max() - daily["date"].min()).days + 1
+        category_totals = daily.groupby("category_id", as_index=False)["value"].sum()
+    current_daily_avg = total_value / days_with_data if days_with_data else 0.0
+
+    remaining_amount = savings_goal - total_value
+    days_remaining = (goal_date - today).days
+    projected_goal_date = None
+    if current_daily_avg > 0:
+        projected_goal_date = today + timedelta(days=int(remaining_amount / current_daily_avg))
+
+    return DashboardMetrics(
+        daily=daily,
+        category_totals=category_totals,
+        total_value=total_value,
+        total_hours=total_hours,
+        avg_rate=total_value / total_hours if total_hours > 0 else 0.0,
+        days_with_data=days_with_data,
+        current_daily_avg=current_daily_avg,
+        savings_goal=savings_goal,
+        remaining_amount=remaining_amount,
+        progress=total_value / savings_goal * 100 if savings_goal > 0 else 0.0,
+        goal_date=goal_date,
+        days_remaining=days_remaining,
+        daily_target=remaining_amount / days_remaining if days_remaining > 0 else 0.0,
+        projected_goal_date=projected_goal_date
+    )
+
+def rates_as_of(daily: pd.DataFrame, rate_history: list) -> pd.Series:
+    """Rate in effect on each row's date for its category.
+
+    `daily` needs datetime `date` and integer `category_id` columns;
+    `rate_history` holds (category_id, rate, valid_from) rows. All rows are
+    matched in one as-of merge. Dates before a category's first recorded
+    rate take that first rate, and categories without history get NaN.
+    """
+    if daily.empty or not rate_history:
+        return pd.Series(np.nan, index=daily.index, dtype=float)
+
+    history = pd.DataFrame(rate_history, columns=["category_id", "rate", "valid_from"])
+    history["category_id"] = history["category_id"].astype("int64")
+    history["rate"] = history["rate"].astype(float)
+    history["valid_from"] = pd.to_datetime(history["valid_from"])
+    history = history.sort_values("valid_from", kind="stable")
+
+    left = pd.DataFrame({
+        "row": np.arange(len(daily)),
+        "date": daily["date"].to_numpy(),
+        "category_id": daily["category_id"].to_numpy().astype("int64")
+    }).sort_values("date", kind="stable")
+    merged = pd.merge_asof(left, history, left_on="date", right_on="valid_from", by="category_id", direction="backward")
+
+    first_rate = history.groupby("category_id")["rate"].first()
+    rates = merged["rate"].fillna(merged["category_id"].map(first_rate))
+
+    out = np.empty(len(daily))
+    out[merged["row"].to_numpy()] = rates.to_numpy()
+    return pd.Series(out, index=daily.index)
+
+def pot_under_rates(daily: pd.DataFrame, rate_history: list, categories: list) -> dict:
+    """Compare the pot as recorded, at the rates in effect on each date and at today's rates.
+
+    Returns a dict with `recorded`, `historical` and `current` totals.
+    """
+    current_rates = daily["category_id"].map({c["id"]: float(c["rate"]) for c in categories})
+    historical_rates = rates_as_of(daily, rate_history).fillna(current_rates)
+    hours = daily["hours"].to_numpy(dtype=float)
+    return {
+        "recorded": float(daily["value"].sum()),
+        "historical": float(np.nansum(hours * historical_rates.to_numpy())),
+        "current": float(np.nansum(hours * current_rates.to_numpy(dtype=float)))
+    }
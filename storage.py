@@ -0,0 +1,788 @@
+"""
+Storage backends for Productivity Tracker
+The app reads and writes categories, logs and settings through a Storage
+object, so the same UI runs against Supabase, a local SQLite file or memory
+"""
+
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+from log_sync import LogSnapshot, delete_snapshots, fetch_log_page, iter_log_pages, load_snapshot, save_snapshot
+
+SQLITE_PATH = os.getenv(
+    "SQLITE_PATH",
+    os.path.join(os.path.expanduser("~"), ".productivity-tracker", "tracker.db")
+)
+
+ROLLUPS_PAGE_SIZE = 1000  # PostgREST's default max rows per request
+# Column defaults of the settings table, for users without a settings row
+DEFAULT_SETTINGS = {"savings_goal": 100000.00, "currency": "USD", "goal_date": "2025-12-31"}
+
+REVALUE_BATCH_SIZE = 5000  # logs repriced per statement by revalue_logs()
+
+logger = logging.getLogger(__name__)
+
+def now_timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def summarize_logs(logs):
+    """Per-category aggregates (same rows as get_user_log_summary()) for any iterable of logs"""
+    rows = {}
+    for log in logs:
+        category = log.get("categories") or {}
+        category_id = log.get("category_id", category.get("id"))
+        row = rows.setdefault(category_id, {
+            "category_id": category_id,
+            "category_name": category.get("name"),
+            "total_hours": 0.0,
+            "total_value": 0.0,
+            "n_logs": 0,
+            "first_date": log["date"],
+            "last_date": log["date"]
+        })
+        row["total_hours"] += float(log["hours"])
+        row["total_value"] += float(log["value"])
+        row["n_logs"] += 1
+        row["first_date"] = min(row["first_date"], log["date"])
+        row["last_date"] = max(row["last_date"], log["date"])
+    return sorted(rows.values(), key=lambda r: r["category_name"] or "")
+
+def rollup_logs(logs):
+    """Daily buckets (same rows as the daily_rollups table) for any iterable of logs"""
+    buckets = {}
+    for log in logs:
+        category = log.get("categories") or {}
+        category_id = log.get("category_id", category.get("id"))
+        bucket = buckets.setdefault((log["date"], category_id), {
+            "date": log["date"],
+            "category_id": category_id,
+            "hours": 0.0,
+            "value": 0.0,
+            "n_logs": 0
+        })
+        bucket["hours"] += float(log["hours"])
+        bucket["value"] += float(log["value"])
+        bucket["n_logs"] += 1
+    return [buckets[key] for key in sorted(buckets, key=lambda k: (k[0], k[1] or 0))]
+
+class Storage(ABC):
+    """Interface shared by all backends.
+
+    Log rows are dicts shaped like Supabase's select("*, categories(*)"):
+    the log columns plus the category row embedded under "categories".
+    Log writes are scoped to the given user. Methods raise on failure and
+    leave reporting to the caller.
+    """
+
+    # Categories
+    @abstractmethod
+    def list_categories(self) -> list:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_category(self, name: str, rate: float, description: str = "") -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_category(self, category_id: int, fields: dict) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_category(self, category_id: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_category_rates(self) -> list:
+        """Rate history rows (category_id, rate, valid_from) ordered by category and date"""
+        raise NotImplementedError
+
+    # Logs
+    @abstractmethod
+    def iter_log_pages(self, user_id: str, page_size: int = 100):
+        """Yield the user's logs newest first, one page at a time"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def log_page(self, user_id: str, page_size: int = 100, after: tuple = None) -> list:
+        """One page of the user's logs newest first, after the (date, id) keyset cursor `after`"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_log(self, row: dict) -> dict:
+        """Insert a log; a row whose client_id is already stored is not written twice"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_log(self, user_id: str, log_id: int, fields: dict) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_logs(self, user_id: str, rows: list) -> list:
+        """Write complete log rows (including id) and return the rows written"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_logs(self, user_id: str, log_ids: list) -> list:
+        """Delete logs and return the ids that were deleted"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def revalue_logs(self, user_id: str, category_id: int, date_from: str = None, date_to: str = None,
+                     batch_size: int = REVALUE_BATCH_SIZE):
+        """Reprice a category's logs at its current rate, optionally within a date range.
+
+        Works through the logs in batches of set-based updates and yields
+        (n_scanned, n_updated) after each one so callers can show progress.
+        """
+        raise NotImplementedError
+
+    def all_logs(self, user_id: str) -> list:
+        return [log for page in self.iter_log_pages(user_id, 1000) for log in page]
+
+    def log_summary(self, user_id: str) -> list:
+        return summarize_logs(self.all_logs(user_id))
+
+    def daily_rollups(self, user_id: str) -> list:
+        return rollup_logs(self.all_logs(user_id))
+
+    # Settings
+    @abstractmethod
+    def get_settings(self, user_id: str):
+        """Return the user's settings row, or None if there is none"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_settings(self, user_id: str, fields: dict) -> dict:
+        """Create or update the user's settings row and return it.
+
+        Columns not in `fields` keep their stored value, or the default for a
+        new row.
+        """
+        raise NotImplementedError
+
+class SupabaseStorage(Storage):
+    """Supabase (PostgREST) backend with a delta-synced log snapshot per user"""
+
+    def __init__(self, client, snapshot_max_age: timedelta = timedelta(minutes=10)):
+        self.client = client
+        self.snapshot_max_age = snapshot_max_age
+        self._snapshots = {}
+        self._dirty_users = set()  # users written through this backend since their last sync
+        self._lock = threading.Lock()
+
+    def list_categories(self):
+        return self.client.table("categories").select("*").order("name").execute().data
+
+    def add_category(self, name, rate, description=""):
+        response = self.client.table("categories").insert({
+            "name": name,
+            "rate": rate,
+            "description": description
+        }).execute()
+        return response.data[0] if response.data else None
+
+    def update_category(self, category_id, fields):
+        response = self.client.table("categories").update(fields).eq("id", category_id).execute()
+        # Snapshots embed the category row, so they are stale for every user.
+        # Deltas only carry changed logs, so drop the disk copies too and let
+        # the next read do a full load.
+        with self._lock:
+            self._snapshots.clear()
+            delete_snapshots()
+        return response.data[0] if response.data else None
+
+    def delete_category(self, category_id):
+        response = self.client.table("categories").delete().eq("id", category_id).execute()
+        return bool(response.data)
+
+    def list_category_rates(self):
+        rows = []
+        while True:
+            response = self.client.table("category_rates").select("category_id, rate, valid_from").order("category_id").order("valid_from").range(len(rows), len(rows) + ROLLUPS_PAGE_SIZE - 1).execute()
+            rows.extend(response.data)
+            if len(response.data) < ROLLUPS_PAGE_SIZE:
+                return rows
+
+    def iter_log_pages(self, user_id, page_size=100):
+        return iter_log_pages(self.client, user_id, page_size)
+
+    def log_page(self, user_id, page_size=100, after=None):
+        return fetch_log_page(self.client, user_id, page_size, after)
+
+    def insert_log(self, row):
+        if row.get("client_id"):
+            # Idempotent retry: a duplicate client_id is skipped, not an error
+            response = self.client.table("logs").upsert(row, on_conflict="client_id", ignore_duplicates=True).execute()
+        else:
+            response = self.client.table("logs").insert(row).execute()
+        self._dirty_users.add(row["user_id"])
+        return response.data[0] if response.data else None
+
+    def update_log(self, user_id, log_id, fields):
+        response = self.client.table("logs").update(fields).eq("id", log_id).eq("user_id", user_id).execute()
+        self._dirty_users.add(user_id)
+        return response.data[0] if response.data else None
+
+    def upsert_logs(self, user_id, rows):
+        rows = [dict(row, user_id=user_id) for row in rows]
+        response = self.client.table("logs").upsert(rows, on_conflict="id").execute()
+        self._dirty_users.add(user_id)
+        return response.data or []
+
+    def delete_logs(self, user_id, log_ids):
+        response = self.client.table("logs").delete().in_("id", log_ids).eq("user_id", user_id).execute()
+        self._dirty_users.add(user_id)
+        return [row["id"] for row in response.data or []]
+
+    def revalue_logs(self, user_id, category_id, date_from=None, date_to=None, batch_size=REVALUE_BATCH_SIZE):
+        after_id = 0
+        while True:
+            response = self.client.rpc("revalue_category_logs", {
+                "p_user_id": user_id,
+                "p_category_id": category_id,
+                "p_from": date_from,
+                "p_to": date_to,
+                "p_after_id": after_id,
+                "p_batch_size": batch_size
+            }).execute()
+            batch = response.data[0] if response.data else {"n_scanned": 0, "n_updated": 0, "last_id": None}
+            if batch["n_updated"]:
+                self._dirty_users.add(user_id)
+            yield batch["n_scanned"], batch["n_updated"]
+            if batch["n_scanned"] < batch_size:
+                return
+            after_id = batch["last_id"]
+
+    def all_logs(self, user_id):
+        """Every log of the user from the local snapshot, kept current by delta sync.
+
+        After a restart the snapshot starts from its Parquet file and is
+        reconciled on a background thread; while that runs, the disk copy
+        is served as is. A user with no copy yet waits for the first load.
+        The dashboard reads daily_rollups() and log_page() instead, which
+        always go to Supabase.
+        """
+        snapshot = self._get_snapshot(user_id)
+        if snapshot.is_loaded() and snapshot.is_syncing():
+            return snapshot.rows()
+        if user_id in self._dirty_users or snapshot.is_stale(self.snapshot_max_age):
+            self._dirty_users.discard(user_id)
+            try:
+                self._refresh(snapshot)
+            except Exception as e:
+                self._dirty_users.add(user_id)
+                if not snapshot.is_loaded():
+                    raise
+                logger.warning("Log sync failed for %s, serving the last synced copy: %s", user_id, e)
+        return snapshot.rows()
+
+    def log_summary(self, user_id):
+        return self.client.rpc("get_user_log_summary", {"p_user_id": user_id}).execute().data
+
+    def daily_rollups(self, user_id):
+        rows = []
+        while True:
+            response = self.client.table("daily_rollups").select("date, category_id, hours, value, n_logs").eq("user_id", user_id).order("date").order("category_id").range(len(rows), len(rows) + ROLLUPS_PAGE_SIZE - 1).execute()
+            rows.extend(response.data)
+            if len(response.data) < ROLLUPS_PAGE_SIZE:
+                return rows
+
+    def get_settings(self, user_id):
+        response = self.client.table("settings").select("*").eq("user_id", user_id).execute()
+        return response.data[0] if response.data else None
+
+    def upsert_settings(self, user_id, fields):
+        response = self.client.table("settings").upsert(dict(fields, user_id=user_id), on_conflict="user_id").execute()
+        return response.data[0] if response.data else None
+
+    def _get_snapshot(self, user_id) -> LogSnapshot:
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            if snapshot is not None:
+                return snapshot
+            try:
+                snapshot = load_snapshot(user_id)
+            except Exception as e:
+                logger.warning("Ignoring unreadable log snapshot for %s: %s", user_id, e)
+                snapshot = None
+            if snapshot is None:
+                snapshot = LogSnapshot(user_id)
+            else:
+                # Serve the disk copy right away and reconcile with Supabase behind it
+                threading.Thread(target=self._refresh_in_background, args=(snapshot,), daemon=True).start()
+            self._snapshots[user_id] = snapshot
+            return snapshot
+
+    def _refresh(self, snapshot: LogSnapshot, blocking: bool = True):
+        # A snapshot dropped by update_category() while syncing is not saved
+        if snapshot.sync(self.client, blocking):
+            with self._lock:
+                if self._snapshots.get(snapshot.user_id) is snapshot:
+                    save_snapshot(snapshot)
+
+    def _refresh_in_background(self, snapshot: LogSnapshot):
+        try:
+            self._refresh(snapshot, blocking=False)
+        except Exception as e:
+            logger.warning("Background log sync failed for %s: %s", snapshot.user_id, e)
+
+class MemoryStorage(Storage):
+    """In-process backend; used for demo mode and as a reference implementation"""
+
+    def __init__(self, categories: list = None, logs: list = None):
+        self._lock = threading.RLock()
+        self._categories = {c["id"]: dict(c) for c in categories or []}
+        self._rates = {}  # (category_id, valid_from) -> rate
+        for category in self._categories.values():
+            self._record_rate(category)
+        self._logs = {}
+        self._settings = {}
+        self._category_ids = itertools.count(max(self._categories, default=0) + 1)
+        for log in logs or []:
+            row = {k: v for k, v in log.items() if k != "categories"}
+            self._logs[row["id"]] = row
+        self._log_ids = itertools.count(max(self._logs, default=0) + 1)
+
+    def list_categories(self):
+        with self._lock:
+            return sorted((dict(c) for c in self._categories.values()), key=lambda c: c["name"])
+
+    def add_category(self, name, rate, description=""):
+        with self._lock:
+            if any(c["name"] == name for c in self._categories.values()):
+                raise ValueError(f"A habit named '{name}' already exists")
+            row = {"id": next(self._category_ids), "name": name, "rate": rate, "description": description}
+            self._categories[row["id"]] = row
+            self._record_rate(row)
+            return dict(row)
+
+    def update_category(self, category_id, fields):
+        with self._lock:
+            row = self._categories.get(category_id)
+            if row is None:
+                return None
+            rate = row["rate"]
+            row.update(fields)
+            if row["rate"] != rate:
+                self._record_rate(row)
+            return dict(row)
+
+    def delete_category(self, category_id):
+        with self._lock:
+            if any(log["category_id"] == category_id for log in self._logs.values()):
+                raise ValueError("This habit still has logged activities")
+            self._rates = {key: rate for key, rate in self._rates.items() if key[0] != category_id}
+            return self._categories.pop(category_id, None) is not None
+
+    def list_category_rates(self):
+        with self._lock:
+            return [
+                {"category_id": category_id, "rate": rate, "valid_from": valid_from}
+                for (category_id, valid_from), rate in sorted(self._rates.items())
+            ]
+
+    def iter_log_pages(self, user_id, page_size=100):
+        with self._lock:
+            logs = sorted(
+                (self._with_category(log) for log in self._logs.values() if log["user_id"] == user_id),
+                key=lambda log: (log["date"], log["id"]),
+                reverse=True
+            )
+        for start in range(0, len(logs), page_size):
+            yield logs[start:start + page_size]
+
+    def log_page(self, user_id, page_size=100, after=None):
+        with self._lock:
+            logs = sorted(
+                (self._with_category(log) for log in self._logs.values()
+                 if log["user_id"] == user_id and (after is None or (log["date"], log["id"]) < tuple(after))),
+                key=lambda log: (log["date"], log["id"]),
+                reverse=True
+            )
+        return logs[:page_size]
+
+    def insert_log(self, row):
+        with self._lock:
+            if row.get("client_id"):
+                existing = next((log for log in self._logs.values() if log.get("client_id") == row["client_id"]), None)
+                if existing is not None:
+                    return self._with_category(existing)
+            row = dict(row, id=next(self._log_ids), created_at=now_timestamp(), updated_at=now_timestamp())
+            self._set_value(row)
+            self._logs[row["id"]] = row
+            return self._with_category(row)
+
+    def update_log(self, user_id, log_id, fields):
+        with self._lock:
+            row = self._logs.get(log_id)
+            if row is None or row["user_id"] != user_id:
+                return None
+            row.update(fields, updated_at=now_timestamp())
+            if "hours" in fields or "category_id" in fields:
+                self._set_value(row)
+            return self._with_category(row)
+
+    def upsert_logs(self, user_id, rows):
+        written = []
+        with self._lock:
+            for row in rows:
+                existing = self._logs.get(row["id"])
+                if existing is not None and existing["user_id"] != user_id:
+                    continue
+                merged = dict(existing or {"created_at": now_timestamp()})
+                merged.update(row, user_id=user_id, updated_at=now_timestamp())
+                if existing is None or "hours" in row or "category_id" in row:
+                    self._set_value(merged)
+                self._logs[row["id"]] = merged
+                written.append(self._with_category(merged))
+        return written
+
+    def delete_logs(self, user_id, log_ids):
+        deleted = []
+        with self._lock:
+            for log_id in log_ids:
+                row = self._logs.get(log_id)
+                if row is not None and row["user_id"] == user_id:
+                    del self._logs[log_id]
+                    deleted.append(log_id)
+        return deleted
+
+    def revalue_logs(self, user_id, category_id, date_from=None, date_to=None, batch_size=REVALUE_BATCH_SIZE):
+        after_id = 0
+        while True:
+            with self._lock:
+                batch = sorted(
+                    (log for log in self._logs.values()
+                     if log["user_id"] == user_id and log["category_id"] == category_id and log["id"] > after_id
+                     and (date_from is None or log["date"] >= date_from)
+                     and (date_to is None or log["date"] <= date_to)),
+                    key=lambda log: log["id"]
+                )[:batch_size]
+                updated = 0
+                for log in batch:
+                    value = log["value"]
+                    self._set_value(log)
+                    if log["value"] != value:
+                        log["updated_at"] = now_timestamp()
+                        updated += 1
+            yield len(batch), updated
+            if len(batch) < batch_size:
+                return
+            after_id = batch[-1]["id"]
+
+    def get_settings(self, user_id):
+        with self._lock:
+            row = self._settings.get(user_id)
+            return dict(row) if row else None
+
+    def upsert_settings(self, user_id, fields):
+        with self._lock:
+            row = self._settings.setdefault(user_id, dict(DEFAULT_SETTINGS, user_id=user_id))
+            row.update(fields)
+            return dict(row)
+
+    def _record_rate(self, category):
+        """Record a rate change, as the record_categories_rate trigger does"""
+        self._rates[(category["id"], datetime.now(timezone.utc).date().isoformat())] = category["rate"]
+
+    def _set_value(self, log):
+        """Price a log from its category's rate, as the Supabase trigger does"""
+        category = self._categories.get(log.get("category_id"))
+        if category is None:
+            raise ValueError(f"Category {log.get('category_id')} not found")
+        log["value"] = log["hours"] * category["rate"]
+
+    def _with_category(self, log):
+        category = self._categories.get(log.get("category_id"))
+        return dict(log, categories=dict(category) if category else None)
+
+class SQLiteStorage(Storage):
+    """Local single-file backend for single-user desktop deployments"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            rate REAL NOT NULL,
+            description TEXT,
+            created_at TEXT,
+            updated_at TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            hours REAL NOT NULL CHECK (hours > 0),
+            category_id INTEGER REFERENCES categories(id) ON DELETE RESTRICT,
+            note TEXT,
+            value REAL NOT NULL DEFAULT 0,
+            client_id TEXT UNIQUE,
+            created_at TEXT,
+            updated_at TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL UNIQUE,
+            savings_goal REAL DEFAULT 100000.00,
+            currency TEXT DEFAULT 'USD',
+            goal_date TEXT DEFAULT '2025-12-31',
+            created_at TEXT,
+            updated_at TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS category_rates (
+            category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
+            rate REAL NOT NULL,
+            valid_from TEXT NOT NULL,
+            PRIMARY KEY (category_id, valid_from)
+        );
+
+        -- Rate history, like the record_categories_rate trigger in supabase_schema.sql
+        CREATE TRIGGER IF NOT EXISTS record_categories_rate_on_insert AFTER INSERT ON categories
+        BEGIN
+            INSERT OR REPLACE INTO category_rates (category_id, rate, valid_from) VALUES (NEW.id, NEW.rate, date('now'));
+        END;
+        CREATE TRIGGER IF NOT EXISTS record_categories_rate_on_update AFTER UPDATE OF rate ON categories
+        WHEN NEW.rate IS NOT OLD.rate
+        BEGIN
+            INSERT OR REPLACE INTO category_rates (category_id, rate, valid_from) VALUES (NEW.id, NEW.rate, date('now'));
+        END;
+        INSERT OR IGNORE INTO category_rates (category_id, rate, valid_from)
+        SELECT id, rate, date(COALESCE(created_at, 'now')) FROM categories;
+
+        -- Logs are priced from their category's rate, like the set_logs_value
+        -- trigger in supabase_schema.sql
+        CREATE TRIGGER IF NOT EXISTS set_logs_value_on_insert AFTER INSERT ON logs
+        BEGIN
+            UPDATE logs SET value = NEW.hours * (SELECT rate FROM categories WHERE id = NEW.category_id)
+            WHERE id = NEW.id AND NEW.category_id IS NOT NULL;
+        END;
+        CREATE TRIGGER IF NOT EXISTS set_logs_value_on_update AFTER UPDATE OF hours, category_id ON logs
+        BEGIN
+            UPDATE logs SET value = NEW.hours * (SELECT rate FROM categories WHERE id = NEW.category_id)
+            WHERE id = NEW.id AND NEW.category_id IS NOT NULL;
+        END;
+
+        -- Serves newest-first keyset pages
+        CREATE INDEX IF NOT EXISTS idx_logs_user_date_id ON logs(user_id, date DESC, id DESC);
+        -- Covering index: the summary and daily rollup queries never touch the table
+        CREATE INDEX IF NOT EXISTS idx_logs_user_date_category ON logs(user_id, date, category_id, hours, value);
+        CREATE INDEX IF NOT EXISTS idx_logs_category ON logs(category_id);
+    """
+
+    LOG_SELECT = """
+        SELECT l.*, c.name AS category_name, c.rate AS category_rate, c.description AS category_description
+        FROM logs l
+        LEFT JOIN categories c ON c.id = l.category_id
+    """
+
+    def __init__(self, path: str = SQLITE_PATH, default_categories: list = None):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Streamlit serves sessions from several threads; a lock serialises access
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA foreign_keys = ON")
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.executescript(self.SCHEMA)
+            if default_categories is None:
+                default_categories = self._config_categories()
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO categories (name, rate, description, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(c["name"], c["rate"], c.get("description", ""), now_timestamp(), now_timestamp()) for c in default_categories]
+            )
+
+    @staticmethod
+    def _config_categories():
+        config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+        try:
+            with open(config_path) as f:
+                return json.load(f).get("default_categories", [])
+        except (OSError, ValueError):
+            return []
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _log_rows(self, where, params=(), suffix=""):
+        rows = self._query(f"{self.LOG_SELECT} WHERE {where} {suffix}", params)
+        for row in rows:
+            category = {
+                "id": row["category_id"],
+                "name": row.pop("category_name"),
+                "rate": row.pop("category_rate"),
+                "description": row.pop("category_description")
+            }
+            row["categories"] = category if category["name"] is not None else None
+        return rows
+
+    def list_categories(self):
+        return self._query("SELECT * FROM categories ORDER BY name")
+
+    def add_category(self, name, rate, description=""):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO categories (name, rate, description, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (name, rate, description, now_timestamp(), now_timestamp())
+            )
+        return self._query("SELECT * FROM categories WHERE id = ?", (cursor.lastrowid,))[0]
+
+    def update_category(self, category_id, fields):
+        columns = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE categories SET {columns}, updated_at = ? WHERE id = ?",
+                (*fields.values(), now_timestamp(), category_id)
+            )
+        rows = self._query("SELECT * FROM categories WHERE id = ?", (category_id,))
+        return rows[0] if rows else None
+
+    def delete_category(self, category_id):
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM categories WHERE id = ?", (category_id,)).rowcount > 0
+
+    def list_category_rates(self):
+        return self._query("SELECT category_id, rate, valid_from FROM category_rates ORDER BY category_id, valid_from")
+
+    def iter_log_pages(self, user_id, page_size=100):
+        after = None
+        while True:
+            page = self.log_page(user_id, page_size, after)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after = (page[-1]["date"], page[-1]["id"])
+
+    def log_page(self, user_id, page_size=100, after=None):
+        order = f"ORDER BY l.date DESC, l.id DESC LIMIT {int(page_size)}"
+        if after is None:
+            return self._log_rows("l.user_id = ?", (user_id,), order)
+        return self._log_rows("l.user_id = ? AND (l.date, l.id) < (?, ?)", (user_id, after[0], after[1]), order)
+
+    def insert_log(self, row):
+        row = dict(row, created_at=now_timestamp(), updated_at=now_timestamp())
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT INTO logs ({columns}) VALUES ({placeholders}) ON CONFLICT(client_id) DO NOTHING", tuple(row.values()))
+            if row.get("client_id"):
+                log_id = self._conn.execute("SELECT id FROM logs WHERE client_id = ?", (row["client_id"],)).fetchone()[0]
+            else:
+                log_id = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return self._log_rows("l.id = ?", (log_id,))[0]
+
+    def update_log(self, user_id, log_id, fields):
+        columns = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE logs SET {columns}, updated_at = ? WHERE id = ? AND user_id = ?",
+                (*fields.values(), now_timestamp(), log_id, user_id)
+            )
+        rows = self._log_rows("l.id = ? AND l.user_id = ?", (log_id, user_id))
+        return rows[0] if rows else None
+
+    def upsert_logs(self, user_id, rows):
+        if not rows:
+            return []
+        with self._lock, self._conn:
+            for row in rows:
+                row = dict(row, user_id=user_id, updated_at=now_timestamp())
+                columns = ", ".join(row)
+                placeholders = ", ".join("?" for _ in row)
+                updates = ", ".join(f"{column} = excluded.{column}" for column in row if column != "id")
+                self._conn.execute(
+                    f"INSERT INTO logs ({columns}) VALUES ({placeholders}) "
+                    f"ON CONFLICT(id) DO UPDATE SET {updates} WHERE logs.user_id = excluded.user_id",
+                    tuple(row.values())
+                )
+        ids = [row["id"] for row in rows]
+        placeholders = ", ".join("?" for _ in ids)
+        return self._log_rows(f"l.user_id = ? AND l.id IN ({placeholders})", (user_id, *ids))
+
+    def delete_logs(self, user_id, log_ids):
+        if not log_ids:
+            return []
+        placeholders = ", ".join("?" for _ in log_ids)
+        with self._lock, self._conn:
+            deleted = [row[0] for row in self._conn.execute(
+                f"SELECT id FROM logs WHERE user_id = ? AND id IN ({placeholders})", (user_id, *log_ids)
+            )]
+            self._conn.execute(
+                f"DELETE FROM logs WHERE user_id = ? AND id IN ({placeholders})", (user_id, *log_ids)
+            )
+        return deleted
+
+    def revalue_logs(self, user_id, category_id, date_from=None, date_to=None, batch_size=REVALUE_BATCH_SIZE):
+        after_id = 0
+        while True:
+            with self._lock, self._conn:
+                ids = [row[0] for row in self._conn.execute("""
+                    SELECT id FROM logs
+                    WHERE user_id = ? AND category_id = ? AND id > ?
+                      AND (? IS NULL OR date >= ?) AND (? IS NULL OR date <= ?)
+                    ORDER BY id LIMIT ?
+                """, (user_id, category_id, after_id, date_from, date_from, date_to, date_to, batch_size))]
+                if not ids:
+                    yield 0, 0
+                    return
+                cursor = self._conn.execute("""
+                    UPDATE logs
+                    SET value = hours * (SELECT rate FROM categories WHERE id = logs.category_id), updated_at = ?
+                    WHERE user_id = ? AND category_id = ? AND id BETWEEN ? AND ?
+                      AND (? IS NULL OR date >= ?) AND (? IS NULL OR date <= ?)
+                      AND value IS NOT hours * (SELECT rate FROM categories WHERE id = logs.category_id)
+                """, (now_timestamp(), user_id, category_id, ids[0], ids[-1], date_from, date_from, date_to, date_to))
+            yield len(ids), cursor.rowcount
+            if len(ids) < batch_size:
+                return
+            after_id = ids[-1]
+
+    def log_summary(self, user_id):
+        return self._query("""
+            SELECT l.category_id, c.name AS category_name,
+                   SUM(l.hours) AS total_hours, SUM(l.value) AS total_value, COUNT(*) AS n_logs,
+                   MIN(l.date) AS first_date, MAX(l.date) AS last_date
+            FROM logs l
+            LEFT JOIN categories c ON c.id = l.category_id
+            WHERE l.user_id = ?
+            GROUP BY l.category_id
+            ORDER BY c.name
+        """, (user_id,))
+
+    def daily_rollups(self, user_id):
+        return self._query("""
+            SELECT date, category_id, SUM(hours) AS hours, SUM(value) AS value, COUNT(*) AS n_logs
+            FROM logs
+            WHERE user_id = ?
+            GROUP BY date, category_id
+            ORDER BY date, category_id
+        """, (user_id,))
+
+    def get_settings(self, user_id):
+        rows = self._query("SELECT * FROM settings WHERE user_id = ?", (user_id,))
+        return rows[0] if rows else None
+
+    def upsert_settings(self, user_id, fields):
+        row = dict(fields, user_id=user_id, created_at=now_timestamp(), updated_at=now_timestamp())
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in row if column not in ("user_id", "created_at"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO settings ({columns}) VALUES ({placeholders}) ON CONFLICT(user_id) DO UPDATE SET {updates}",
+                tuple(row.values())
+            )
+        return self.get_settings(user_id)
@@ -20,6 +20,7 @@ CREATE TABLE IF NOT EXISTS logs (
     category_id INTEGER REFERENCES categories(id) ON DELETE RESTRICT,
     note TEXT,
     value DECIMAL(10,2) NOT NULL,
+    client_id UUID UNIQUE,  -- idempotency key set by clients that retry inserts
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -34,6 +35,35 @@ CREATE TABLE IF NOT EXISTS settings (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Create daily rollups table: one row per user, day and category, kept in
+-- sync with logs by the triggers below so charts read day buckets, not rows
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
+    hours DECIMAL(12,2) NOT NULL DEFAULT 0,
+    value DECIMAL(14,2) NOT NULL DEFAULT 0,
+    n_logs INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date, category_id)
+);
+
+-- Create log tombstones table: records deleted log ids so clients syncing
+-- by logs.updated_at can drop them from their local copies
+CREATE TABLE IF NOT EXISTS log_tombstones (
+    log_id INTEGER PRIMARY KEY,
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Create category rate history: the rate of each category from valid_from
+-- until the next entry, written by the trigger on categories
+CREATE TABLE IF NOT EXISTS category_rates (
+    category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
+    rate DECIMAL(10,2) NOT NULL,
+    valid_from DATE NOT NULL DEFAULT CURRENT_DATE,
+    PRIMARY KEY (category_id, valid_from)
+);
+
 -- Insert default categories
 INSERT INTO categories (name, rate, description) VALUES
     ('Work', 50.00, 'Professional work activities'),
@@ -44,13 +74,20 @@ INSERT INTO categories (name, rate, description) VALUES
 ON CONFLICT (name) DO NOTHING;
 
 -- Create indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_logs_user_date ON logs(user_id, date DESC);
+-- (user_id, date, id) also serves keyset pagination; it supersedes idx_logs_user_date
+DROP INDEX IF EXISTS idx_logs_user_date;
+CREATE INDEX IF NOT EXISTS idx_logs_user_date_id ON logs(user_id, date DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_logs_category ON logs(category_id);
 CREATE INDEX IF NOT EXISTS idx_logs_created_at ON logs(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_logs_user_updated_at ON logs(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_log_tombstones_user_deleted_at ON log_tombstones(user_id, deleted_at);
 
 -- Enable Row Level Security (RLS)
 ALTER TABLE logs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE settings ENABLE ROW LEVEL SECURITY;
+ALTER TABLE daily_rollups ENABLE ROW LEVEL SECURITY;
+ALTER TABLE log_tombstones ENABLE ROW LEVEL SECURITY;
+ALTER TABLE category_rates ENABLE ROW LEVEL SECURITY;
 
 -- Create RLS policies
 CREATE POLICY "Users can view their own logs" ON logs
@@ -74,6 +111,18 @@ CREATE POLICY "Users can insert their own settings" ON settings
 CREATE POLICY "Users can update their own settings" ON settings
     FOR UPDATE USING (auth.uid() = user_id);
 
+-- Rollups are only written by the triggers on logs
+CREATE POLICY "Users can view their own daily rollups" ON daily_rollups
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- Tombstones are only written by the trigger on logs
+CREATE POLICY "Users can view their own log tombstones" ON log_tombstones
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- Rate history is only written by the trigger on categories
+CREATE POLICY "Anyone can view category rates" ON category_rates
+    FOR SELECT USING (true);
+
 -- Create function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -92,3 +141,203 @@ CREATE TRIGGER update_logs_updated_at BEFORE UPDATE ON logs
 
 CREATE TRIGGER update_settings_updated_at BEFORE UPDATE ON settings
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Create function to record category rate changes. A change made on the
+-- same day replaces that day's entry. It runs as the table owner because
+-- users only have SELECT access to category_rates.
+CREATE OR REPLACE FUNCTION record_category_rate()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.rate IS DISTINCT FROM OLD.rate THEN
+        INSERT INTO category_rates (category_id, rate, valid_from)
+        VALUES (NEW.id, NEW.rate, CURRENT_DATE)
+        ON CONFLICT (category_id, valid_from) DO UPDATE SET rate = EXCLUDED.rate;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+-- Create trigger for category rate history
+CREATE TRIGGER record_categories_rate AFTER INSERT OR UPDATE OF rate ON categories
+    FOR EACH ROW EXECUTE FUNCTION record_category_rate();
+
+-- Create function to price a log from its category's rate. Clients write
+-- hours and category_id in a single request and the value is taken from the
+-- rate in the same transaction, so it cannot go stale between a lookup and
+-- the write.
+CREATE OR REPLACE FUNCTION set_log_value()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_rate DECIMAL(10,2);
+BEGIN
+    IF NEW.category_id IS NULL THEN
+        NEW.value = COALESCE(NEW.value, 0);
+        RETURN NEW;
+    END IF;
+
+    SELECT rate INTO v_rate FROM categories WHERE id = NEW.category_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Category % not found', NEW.category_id
+            USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    NEW.value = NEW.hours * v_rate;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+-- Create trigger for log values. Only writes that touch hours or the
+-- category reprice a log; past logs otherwise keep the rate they were
+-- logged at.
+CREATE TRIGGER set_logs_value BEFORE INSERT OR UPDATE OF hours, category_id ON logs
+    FOR EACH ROW EXECUTE FUNCTION set_log_value();
+
+-- Create function to add a (possibly negative) delta to one daily rollup bucket
+CREATE OR REPLACE FUNCTION apply_daily_rollup(
+    p_user_id UUID,
+    p_date DATE,
+    p_category_id INTEGER,
+    p_hours DECIMAL,
+    p_value DECIMAL,
+    p_n_logs INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+    IF p_user_id IS NULL OR p_category_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO daily_rollups (user_id, date, category_id, hours, value, n_logs)
+    VALUES (p_user_id, p_date, p_category_id, p_hours, p_value, p_n_logs)
+    ON CONFLICT (user_id, date, category_id) DO UPDATE SET
+        hours = daily_rollups.hours + EXCLUDED.hours,
+        value = daily_rollups.value + EXCLUDED.value,
+        n_logs = daily_rollups.n_logs + EXCLUDED.n_logs;
+
+    -- Drop buckets whose last log was removed or moved away
+    DELETE FROM daily_rollups
+    WHERE user_id = p_user_id AND date = p_date AND category_id = p_category_id AND n_logs <= 0;
+END;
+$$ language 'plpgsql';
+
+-- Create function to keep daily_rollups in sync with logs. It runs as the
+-- table owner because users only have SELECT access to daily_rollups.
+CREATE OR REPLACE FUNCTION update_daily_rollups()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_daily_rollup(OLD.user_id, OLD.date, OLD.category_id, -OLD.hours, -OLD.value, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_daily_rollup(NEW.user_id, NEW.date, NEW.category_id, NEW.hours, NEW.value, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+-- Create trigger for daily rollups
+CREATE TRIGGER update_logs_daily_rollups AFTER INSERT OR UPDATE OR DELETE ON logs
+    FOR EACH ROW EXECUTE FUNCTION update_daily_rollups();
+
+-- Create function to record deleted logs for incremental sync
+CREATE OR REPLACE FUNCTION record_log_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO log_tombstones (log_id, user_id, deleted_at)
+    VALUES (OLD.id, OLD.user_id, NOW())
+    ON CONFLICT (log_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN OLD;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+-- Create trigger for log tombstones
+CREATE TRIGGER record_logs_tombstone AFTER DELETE ON logs
+    FOR EACH ROW EXECUTE FUNCTION record_log_tombstone();
+
+-- Tombstones only need to outlive the clients' sync interval (see
+-- TOMBSTONE_RETENTION in log_sync.py); prune old ones periodically with:
+--   DELETE FROM log_tombstones WHERE deleted_at < NOW() - INTERVAL '30 days';
+
+-- Start the rate history of existing categories at their current rate
+INSERT INTO category_rates (category_id, rate, valid_from)
+SELECT id, rate, COALESCE(created_at::DATE, CURRENT_DATE)
+FROM categories
+ON CONFLICT (category_id, valid_from) DO NOTHING;
+
+-- Backfill rollups for logs written before the trigger existed
+INSERT INTO daily_rollups (user_id, date, category_id, hours, value, n_logs)
+SELECT user_id, date, category_id, SUM(hours), SUM(value), COUNT(*)
+FROM logs
+WHERE user_id IS NOT NULL AND category_id IS NOT NULL
+GROUP BY user_id, date, category_id
+ON CONFLICT (user_id, date, category_id) DO NOTHING;
+
+-- Dashboard aggregates: one row per category the user has logged.
+-- Runs with the caller's privileges, so the logs RLS policies still apply.
+CREATE OR REPLACE FUNCTION get_user_log_summary(p_user_id UUID)
+RETURNS TABLE (
+    category_id INTEGER,
+    category_name VARCHAR(100),
+    total_hours DECIMAL(12,2),
+    total_value DECIMAL(14,2),
+    n_logs BIGINT,
+    first_date DATE,
+    last_date DATE
+) AS $$
+    SELECT
+        l.category_id,
+        c.name,
+        SUM(l.hours),
+        SUM(l.value),
+        COUNT(*),
+        MIN(l.date),
+        MAX(l.date)
+    FROM logs l
+    LEFT JOIN categories c ON c.id = l.category_id
+    WHERE l.user_id = p_user_id
+    GROUP BY l.category_id, c.name
+    ORDER BY c.name;
+$$ language 'sql' STABLE;
+
+-- Reprice one category's logs at its current rate, optionally only within a
+-- date range. Logs are processed in id order, p_batch_size at a time, each
+-- batch one set-based UPDATE; callers pass back last_id as p_after_id to
+-- continue and can report progress between batches. Runs with the caller's
+-- privileges, so the logs RLS policies still apply.
+CREATE OR REPLACE FUNCTION revalue_category_logs(
+    p_user_id UUID,
+    p_category_id INTEGER,
+    p_from DATE DEFAULT NULL,
+    p_to DATE DEFAULT NULL,
+    p_after_id INTEGER DEFAULT 0,
+    p_batch_size INTEGER DEFAULT 5000
+)
+RETURNS TABLE (
+    n_scanned INTEGER,
+    n_updated INTEGER,
+    last_id INTEGER
+) AS $$
+    WITH batch AS (
+        SELECT id
+        FROM logs
+        WHERE user_id = p_user_id
+          AND category_id = p_category_id
+          AND id > p_after_id
+          AND (p_from IS NULL OR date >= p_from)
+          AND (p_to IS NULL OR date <= p_to)
+        ORDER BY id
+        LIMIT p_batch_size
+    ),
+    updated AS (
+        UPDATE logs l
+        SET value = ROUND(l.hours * c.rate, 2)
+        FROM batch b, categories c
+        WHERE l.id = b.id
+          AND c.id = l.category_id
+          AND l.value IS DISTINCT FROM ROUND(l.hours * c.rate, 2)
+        RETURNING l.id
+    )
+    SELECT
+        (SELECT COUNT(*) FROM batch)::INTEGER,
+        (SELECT COUNT(*) FROM updated)::INTEGER,
+        (SELECT MAX(id) FROM batch);
+$$ language 'sql';
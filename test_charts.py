@@ -0,0 +1,43 @@
+"""
+Tests for chart resampling and LTTB downsampling
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from charts import cumulative_chart_data, lttb
+
+@pytest.mark.parametrize("n, n_out", [(10, 3), (1000, 50), (1001, 500), (5000, 7)])
+def test_lttb_keeps_endpoints_and_order(n, n_out):
+    rng = np.random.default_rng(n)
+    x = np.sort(rng.uniform(0, 1e6, size=n))
+    y = np.cumsum(rng.normal(size=n))
+
+    keep = lttb(x, y, n_out)
+
+    assert len(keep) == n_out
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert np.all(np.diff(keep) > 0)
+
+def test_lttb_returns_everything_when_short():
+    x = np.arange(5, dtype=float)
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+    assert lttb(x, x, 2).tolist() == [0, 1, 2, 3, 4]
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[637] = 100.0
+    assert 637 in lttb(x, y, 20)
+
+def test_cumulative_chart_data_bounds_points_and_keeps_last_total():
+    days = pd.date_range("2018-01-01", periods=3000)
+    value = np.random.default_rng(0).normal(size=len(days))
+    totals = pd.DataFrame({"date": days, "value": value, "cumulative_value": np.cumsum(value)})
+
+    data = cumulative_chart_data(totals, max_points=200)
+
+    assert len(data) == 200
+    assert data["date"].is_monotonic_increasing
+    assert data["cumulative_value"].iloc[-1] == pytest.approx(totals["cumulative_value"].iloc[-1])
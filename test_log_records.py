@@ -0,0 +1,90 @@
+"""
+Tests for the compact log column store and the Recent Activities edit diff
+"""
+
+import numpy as np
+
+from log_records import LogRecords, diff_log_edits, logs_frame
+
+HABIT = {"id": 4, "name": "Habit", "rate": 25.0}
+
+def make_log(id, date="2024-01-01", hours=1.5, category=HABIT):
+    return {
+        "id": id, "date": date, "hours": hours, "value": hours * category["rate"],
+        "category_id": category["id"], "note": "", "categories": category
+    }
+
+def test_view_shares_memory_with_the_columns():
+    records = LogRecords.from_rows([make_log(1), make_log(2, date="2024-01-02", hours=0.25)])
+
+    view = records.view()
+
+    for column in ("id", "date_ordinal", "hours_centi", "value_cents", "category_code"):
+        assert np.shares_memory(view[column].to_numpy(), getattr(records, column))
+    assert view["hours_centi"].tolist() == [150, 25]
+    assert view["value_cents"].tolist() == [3750, 625]
+
+def test_logs_without_a_category_reuse_a_habit_named_unknown():
+    unknown = {"id": 7, "name": "Unknown", "rate": 10.0}
+    orphan = dict(make_log(3), category_id=None, categories=None)
+    logs = [make_log(1), make_log(2, category=unknown), orphan]
+
+    frame = logs_frame(logs)
+
+    assert list(frame["category_name"].cat.categories) == ["Habit", "Unknown"]
+    assert frame["category_name"].tolist() == ["Habit", "Unknown", "Unknown"]
+
+def test_logs_without_a_category_decode_as_unknown():
+    orphan = dict(make_log(3), category_id=None, categories=None)
+
+    frame = logs_frame([make_log(1), orphan])
+
+    assert frame["category_name"].tolist() == ["Habit", "Unknown"]
+    assert frame["category_id"].tolist() == [4, -1]
+    assert frame["category_rate"].tolist() == [25.0, 0.0]
+
+def grid(logs):
+    """The Recent Activities grid as show_recent_activities() builds it"""
+    frame = LogRecords.from_rows(logs).to_frame()[["id", "date", "category_id", "category_name", "hours", "value", "note"]]
+    frame["date"] = frame["date"].dt.date
+    frame["category_name"] = frame["category_name"].astype(str)
+    frame["delete"] = False
+    return frame
+
+def test_diff_log_edits_returns_only_changed_rows():
+    original = grid([make_log(1), make_log(2), make_log(3), make_log(4)])
+    edited = original.copy()
+    edited.loc[1, "hours"] = 2.0
+    edited.loc[2, "category_name"] = "Gym"
+    edited.loc[3, "delete"] = True
+    edited.loc[3, "note"] = "ignored, the row is deleted"
+
+    updates, deletes, unknown = diff_log_edits(original, edited, {"Habit": 4, "Gym": 5})
+
+    assert [(row["id"], row["hours"], row["category_id"]) for row in updates] == [(2, 2.0, 4), (3, 1.5, 5)]
+    assert deletes == [4]
+    assert unknown == []
+
+def test_diff_log_edits_treats_missing_and_empty_notes_alike():
+    original = grid([make_log(1), dict(make_log(2), note=None)])
+    edited = original.copy()
+    edited["note"] = ["", ""]
+
+    assert diff_log_edits(original, edited, {"Habit": 4}) == ([], [], [])
+
+    edited.loc[1, "note"] = "gym"
+    updates, _, _ = diff_log_edits(original, edited, {"Habit": 4})
+    assert updates == [{"id": 2, "date": original.loc[1, "date"], "hours": 1.5, "category_id": 4, "note": "gym"}]
+
+def test_diff_log_edits_reports_rows_with_an_unknown_habit():
+    orphan = dict(make_log(2), category_id=None, categories=None)
+    original = grid([make_log(1), orphan, make_log(3)])
+    edited = original.copy()
+    edited["hours"] = 3.0
+    edited.loc[2, "category_name"] = "Deleted habit"
+
+    updates, deletes, unknown = diff_log_edits(original, edited, {"Habit": 4})
+
+    assert [row["id"] for row in updates] == [1]
+    assert deletes == []
+    assert unknown == [2, 3]
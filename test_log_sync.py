@@ -0,0 +1,150 @@
+"""
+Tests for the incremental log sync against the in-memory PostgREST client
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import log_sync
+from log_sync import SYNC_OVERLAP, LogSnapshot, iter_log_pages, load_snapshot, save_snapshot
+
+USER = "user-1"
+T0 = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+def add_log(supabase, date="2024-01-01", hours=1.0, category_id=1):
+    return supabase.table("logs").insert({
+        "user_id": USER, "date": date, "hours": hours, "category_id": category_id, "note": ""
+    }).execute().data[0]
+
+def set_clock(supabase, when):
+    supabase.clock = lambda: when
+
+def test_sync_without_tombstones_table(supabase):
+    del supabase.tables["log_tombstones"]
+    first = add_log(supabase)
+    second = add_log(supabase, date="2024-01-02")
+    snapshot = LogSnapshot(USER)
+
+    assert snapshot.sync(supabase) == 2
+    assert snapshot.deleted_mark is None
+    assert not snapshot.has_tombstones
+
+    # Every later sync reloads, so deletions are still picked up
+    supabase.table("logs").delete().eq("id", first["id"]).execute()
+    snapshot.sync(supabase)
+    assert [row["id"] for row in snapshot.rows()] == [second["id"]]
+
+def test_delta_sync_falls_back_when_tombstones_table_is_missing(supabase):
+    add_log(supabase)
+    snapshot = LogSnapshot(USER)
+    snapshot.sync(supabase)
+    assert snapshot.has_tombstones
+
+    del supabase.tables["log_tombstones"]
+    add_log(supabase, date="2024-01-02")
+    snapshot.sync(supabase)
+
+    assert len(snapshot.rows()) == 2
+    assert not snapshot.has_tombstones
+
+def test_deleted_log_is_dropped(supabase):
+    set_clock(supabase, T0)
+    kept = add_log(supabase)
+    gone = add_log(supabase)
+    snapshot = LogSnapshot(USER)
+    snapshot.sync(supabase)
+
+    set_clock(supabase, T0 + timedelta(minutes=1))
+    supabase.table("logs").delete().eq("id", gone["id"]).execute()
+
+    assert snapshot.sync(supabase) == 1
+    assert [row["id"] for row in snapshot.rows()] == [kept["id"]]
+
+def test_log_written_again_after_its_deletion_stays(supabase):
+    set_clock(supabase, T0)
+    log = add_log(supabase)
+    snapshot = LogSnapshot(USER)
+    snapshot.sync(supabase)
+
+    # Deleted, then written back under the same id (e.g. a bulk upsert)
+    set_clock(supabase, T0 + timedelta(minutes=1))
+    supabase.table("logs").delete().eq("id", log["id"]).execute()
+    set_clock(supabase, T0 + timedelta(minutes=2))
+    supabase.table("logs").upsert(dict(log, hours=3.0), on_conflict="id").execute()
+
+    snapshot.sync(supabase)
+    assert [row["hours"] for row in snapshot.rows()] == [3.0]
+
+    # A later deletion wins again
+    set_clock(supabase, T0 + timedelta(minutes=3))
+    supabase.table("logs").delete().eq("id", log["id"]).execute()
+    snapshot.sync(supabase)
+    assert snapshot.rows() == []
+
+def test_rows_committed_behind_the_mark_are_reread(supabase):
+    set_clock(supabase, T0)
+    add_log(supabase)
+    snapshot = LogSnapshot(USER)
+    snapshot.sync(supabase)
+
+    # A transaction that started before the last sync commits after it,
+    # with an updated_at older than the snapshot's mark
+    set_clock(supabase, T0 - SYNC_OVERLAP / 2)
+    late = add_log(supabase, date="2024-01-02")
+
+    assert snapshot.sync(supabase) == 1
+    assert late["id"] in snapshot.logs
+    assert snapshot.updated_mark == T0.isoformat()
+
+def test_snapshot_synced_after_a_restart(supabase, tmp_path):
+    set_clock(supabase, T0)
+    kept = add_log(supabase)
+    gone = add_log(supabase)
+    snapshot = LogSnapshot(USER)
+    snapshot.sync(supabase)
+    assert save_snapshot(snapshot, str(tmp_path))
+
+    restored = load_snapshot(USER, str(tmp_path))
+    assert restored.has_tombstones
+    assert restored.rows()[0]["categories"] == snapshot.rows()[0]["categories"]
+    assert [row["id"] for row in restored.rows()] == [row["id"] for row in snapshot.rows()]
+
+    set_clock(supabase, T0 + timedelta(minutes=1))
+    supabase.table("logs").delete().eq("id", gone["id"]).execute()
+    added = add_log(supabase, date="2024-01-03")
+    supabase.calls.clear()
+
+    restored.sync(supabase)
+    assert sorted(restored.logs) == sorted([kept["id"], added["id"]])
+    # A delta, not a reload: only rows changed since the mark are asked for
+    assert ("logs", "select") in supabase.calls and len(supabase.calls) == 2
+
+def test_snapshot_file_without_tombstone_flag_reloads(supabase, tmp_path):
+    add_log(supabase)
+    snapshot = LogSnapshot(USER)
+    snapshot.sync(supabase)
+    snapshot.has_tombstones = None  # as written before the flag was saved
+    save_snapshot(snapshot, str(tmp_path))
+
+    restored = load_snapshot(USER, str(tmp_path))
+    add_log(supabase, date="2024-01-02")
+
+    assert restored.sync(supabase) == 2
+    assert restored.has_tombstones
+
+def test_readers_see_the_previous_copy_during_a_sync(supabase, monkeypatch):
+    first = add_log(supabase)
+    snapshot = LogSnapshot(USER)
+    snapshot.sync(supabase)
+    add_log(supabase, date="2024-01-02")
+    snapshot.has_tombstones = False  # force a full reload
+
+    seen = []
+    def pages(*args, **kwargs):
+        for page in iter_log_pages(*args, **kwargs):
+            seen.append(sorted(snapshot.logs))
+            yield page
+    monkeypatch.setattr(log_sync, "iter_log_pages", pages)
+    snapshot.sync(supabase)
+
+    assert seen == [[first["id"]]]
+    assert len(snapshot.logs) == 2
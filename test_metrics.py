@@ -0,0 +1,141 @@
+"""
+Tests for the prefix-sum index, totals and rate history behind the dashboard metrics
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics import PrefixIndex, daily_frame, dashboard_metrics, pot_under_rates, rates_as_of, user_index
+from storage import rollup_logs, summarize_logs
+
+START = date(2024, 1, 1)
+
+def random_rollups(rng, n_days=120, category_ids=(1, 2, 3)):
+    rows = []
+    for offset in sorted(rng.choice(n_days, size=n_days // 2, replace=False).tolist()):
+        for category_id in sorted(rng.choice(category_ids, size=rng.integers(1, len(category_ids) + 1), replace=False).tolist()):
+            rows.append({
+                "date": (START + timedelta(days=offset)).isoformat(),
+                "category_id": category_id,
+                "hours": float(rng.integers(1, 40)) / 4,
+                "value": float(rng.integers(-200, 800)),
+                "n_logs": 1
+            })
+    return rows
+
+def brute_force_total(rows, date_from=None, date_to=None, category_id=None):
+    value = hours = 0.0
+    for row in rows:
+        day = date.fromisoformat(row["date"])
+        if date_from and day < date_from or date_to and day > date_to:
+            continue
+        if category_id is not None and row["category_id"] != category_id:
+            continue
+        value += row["value"]
+        hours += row["hours"]
+    return value, hours
+
+def assert_matches(index, rows, rng):
+    for _ in range(50):
+        lo, hi = sorted(rng.integers(-5, 130, size=2).tolist())
+        date_from, date_to = START + timedelta(days=lo), START + timedelta(days=hi)
+        category_id = [None, 1, 2, 3][rng.integers(0, 4)]
+        expected = brute_force_total(rows, date_from, date_to, category_id)
+        assert index.total(date_from, date_to, category_id) == pytest.approx(expected)
+    assert index.total() == pytest.approx(brute_force_total(rows))
+
+def test_prefix_index_matches_brute_force():
+    rng = np.random.default_rng(0)
+    rows = random_rollups(rng)
+    assert_matches(PrefixIndex.from_daily(daily_frame(rows)), rows, rng)
+
+@pytest.mark.parametrize("edit", ["append", "change_middle", "delete_middle", "new_category", "prepend"])
+def test_user_index_suffix_rebuild_matches_brute_force(edit):
+    rng = np.random.default_rng(1)
+    rows = random_rollups(rng)
+    user_id = f"suffix-{edit}"
+    user_index(user_id, daily_frame(rows))
+
+    rows = [dict(row) for row in rows]
+    middle = len(rows) // 2
+    if edit == "append":
+        rows.append({"date": (START + timedelta(days=200)).isoformat(), "category_id": 1, "hours": 1.0, "value": 50.0, "n_logs": 1})
+    elif edit == "change_middle":
+        rows[middle]["value"] += 123.0
+    elif edit == "delete_middle":
+        del rows[middle]
+    elif edit == "new_category":
+        rows.insert(middle, dict(rows[middle], category_id=9, value=7.0))
+    else:
+        rows.insert(0, {"date": (START - timedelta(days=10)).isoformat(), "category_id": 2, "hours": 2.0, "value": -30.0, "n_logs": 1})
+
+    index = user_index(user_id, daily_frame(rows))
+
+    assert_matches(index, rows, rng)
+    assert index.total(category_id=9) == pytest.approx(brute_force_total(rows, category_id=9))
+    expected = PrefixIndex.from_daily(daily_frame(rows)).daily_totals()
+    pd.testing.assert_frame_equal(index.daily_totals(), expected)
+
+def test_summary_totals_match_the_daily_buckets():
+    rng = np.random.default_rng(2)
+    logs = [
+        {"date": row["date"], "category_id": row["category_id"], "hours": row["hours"], "value": row["value"],
+         "categories": {"id": row["category_id"], "name": f"habit {row['category_id']}"}}
+        for row in random_rollups(rng)
+    ]
+    daily = rollup_logs(logs)
+    goal_date, today = START + timedelta(days=365), START + timedelta(days=130)
+
+    from_daily = dashboard_metrics(daily, 5000.0, goal_date, today)
+    from_summary = dashboard_metrics(daily, 5000.0, goal_date, today, summary=summarize_logs(logs))
+
+    assert from_summary is not from_daily
+    for field in ("total_value", "total_hours", "days_with_data", "current_daily_avg", "remaining_amount", "projected_goal_date"):
+        assert getattr(from_summary, field) == pytest.approx(getattr(from_daily, field))
+    pd.testing.assert_frame_equal(from_summary.category_totals, from_daily.category_totals)
+
+RATE_HISTORY = [
+    {"category_id": 1, "rate": 30.0, "valid_from": "2024-03-01"},
+    {"category_id": 1, "rate": 20.0, "valid_from": "2024-01-10"},
+    {"category_id": 2, "rate": -5.0, "valid_from": "2024-01-01"}
+]
+
+def test_rates_as_of_uses_the_rate_in_effect_on_each_date():
+    # Deliberately out of date order: the result follows the input rows
+    daily = daily_frame([
+        {"date": "2024-03-05", "category_id": 1, "hours": 1.0, "value": 30.0, "n_logs": 1},
+        {"date": "2024-01-05", "category_id": 1, "hours": 1.0, "value": 20.0, "n_logs": 1},
+        {"date": "2024-02-01", "category_id": 3, "hours": 1.0, "value": 10.0, "n_logs": 1},
+        {"date": "2024-01-10", "category_id": 1, "hours": 1.0, "value": 20.0, "n_logs": 1},
+        {"date": "2024-02-01", "category_id": 2, "hours": 1.0, "value": -5.0, "n_logs": 1}
+    ]).set_index(pd.Index([10, 11, 12, 13, 14]))
+
+    rates = rates_as_of(daily, RATE_HISTORY)
+
+    assert rates.index.tolist() == [10, 11, 12, 13, 14]
+    # Before the first recorded rate the first rate applies; no history is NaN
+    assert rates.tolist()[:2] == [30.0, 20.0]
+    assert np.isnan(rates.iloc[2])
+    assert rates.tolist()[3:] == [20.0, -5.0]
+
+def test_rates_as_of_without_history():
+    daily = daily_frame([{"date": "2024-01-05", "category_id": 1, "hours": 1.0, "value": 20.0, "n_logs": 1}])
+    assert rates_as_of(daily, []).isna().all()
+    assert rates_as_of(daily_frame([]), RATE_HISTORY).empty
+
+def test_pot_under_rates_falls_back_to_the_current_rate():
+    daily = daily_frame([
+        {"date": "2024-02-01", "category_id": 1, "hours": 2.0, "value": 50.0, "n_logs": 1},
+        {"date": "2024-03-02", "category_id": 1, "hours": 1.0, "value": 25.0, "n_logs": 1},
+        {"date": "2024-02-01", "category_id": 3, "hours": 4.0, "value": 40.0, "n_logs": 1}
+    ])
+    categories = [{"id": 1, "rate": 25.0}, {"id": 3, "rate": 15.0}]
+
+    pot = pot_under_rates(daily, RATE_HISTORY, categories)
+
+    assert pot["recorded"] == pytest.approx(115.0)
+    assert pot["historical"] == pytest.approx(2 * 20.0 + 1 * 30.0 + 4 * 15.0)
+    assert pot["current"] == pytest.approx(3 * 25.0 + 4 * 15.0)
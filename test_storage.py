@@ -0,0 +1,144 @@
+"""
+Tests for the storage backends
+The same calls go through the in-memory, SQLite and Supabase backends, with
+rows shaped the way app.py builds them
+"""
+
+import threading
+
+import pytest
+
+import log_sync
+from conftest import CATEGORIES
+import storage as storage_module
+from storage import MemoryStorage, SQLiteStorage, Storage, SupabaseStorage
+
+USER = "user-1"
+OTHER_USER = "user-2"
+
+@pytest.fixture(params=["memory", "sqlite", "supabase"])
+def storage(request, supabase):
+    if request.param == "memory":
+        return MemoryStorage(categories=CATEGORIES)
+    if request.param == "sqlite":
+        return SQLiteStorage(":memory:", default_categories=CATEGORIES)
+    return SupabaseStorage(supabase)
+
+def new_log(storage, user_id, date="2024-01-01", hours=2.0, category_id=1, note=""):
+    # Same row as app.insert_log()
+    return storage.insert_log({"user_id": user_id, "date": date, "hours": hours, "category_id": category_id, "note": note})
+
+def test_upsert_logs_with_app_rows(storage):
+    first = new_log(storage, USER)
+    second = new_log(storage, USER, date="2024-01-02")
+
+    # Same rows as app.bulk_update_logs()
+    written = storage.upsert_logs(USER, [
+        {"id": first["id"], "user_id": USER, "date": "2024-01-01", "hours": 3.0, "category_id": 2, "note": "edited"},
+        {"id": second["id"], "user_id": USER, "date": "2024-01-05", "hours": 1.0, "category_id": 1, "note": ""}
+    ])
+
+    assert sorted(row["id"] for row in written) == sorted([first["id"], second["id"]])
+    logs = {log["id"]: log for log in storage.log_page(USER)}
+    assert logs[first["id"]]["note"] == "edited"
+    assert float(logs[first["id"]]["value"]) == pytest.approx(-45.0)
+    assert logs[first["id"]]["categories"]["name"] == "Social Media"
+    assert logs[second["id"]]["date"] == "2024-01-05"
+    assert float(logs[second["id"]]["value"]) == pytest.approx(50.0)
+
+def test_upsert_logs_keeps_other_users_rows(storage):
+    theirs = new_log(storage, OTHER_USER, note="theirs")
+    if isinstance(storage, SupabaseStorage):
+        pytest.skip("row ownership is enforced by RLS on the server")
+
+    storage.upsert_logs(USER, [
+        {"id": theirs["id"], "user_id": USER, "date": "2024-01-01", "hours": 9.0, "category_id": 1, "note": "mine"}
+    ])
+
+    assert storage.log_page(USER) == []
+    assert storage.log_page(OTHER_USER)[0]["note"] == "theirs"
+
+def test_log_page_keyset(storage):
+    ids = [new_log(storage, USER, date=f"2024-01-0{day}")["id"] for day in (1, 2, 2, 3)]
+
+    first = storage.log_page(USER, page_size=2)
+    rest = storage.log_page(USER, page_size=2, after=(first[-1]["date"], first[-1]["id"]))
+
+    assert [log["id"] for log in first + rest] == [ids[3], ids[2], ids[1], ids[0]]
+
+def test_revalue_logs_in_batches_within_the_date_range(storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(log_sync, "CACHE_DIR", str(tmp_path))
+    before = new_log(storage, USER, date="2024-01-01")
+    in_range = [new_log(storage, USER, date=day) for day in ("2024-01-02", "2024-01-03")]
+    other_habit = new_log(storage, USER, date="2024-01-02", category_id=2)
+    theirs = new_log(storage, OTHER_USER, date="2024-01-02")
+    storage.update_category(1, {"rate": 60.0})
+    # Priced at the new rate already: scanned but not updated
+    current = new_log(storage, USER, date="2024-01-04")
+
+    progress = list(storage.revalue_logs(USER, 1, "2024-01-02", "2024-01-04", batch_size=2))
+
+    assert progress == [(2, 2), (1, 0)]
+    values = {log["id"]: float(log["value"]) for log in storage.log_page(USER)}
+    assert values[before["id"]] == pytest.approx(100.0)
+    assert [values[log["id"]] for log in in_range + [current]] == pytest.approx([120.0] * 3)
+    assert values[other_habit["id"]] == pytest.approx(-30.0)
+    assert float(storage.log_page(OTHER_USER)[0]["value"]) == pytest.approx(100.0)
+
+def test_update_category_drops_snapshots(supabase, tmp_path, monkeypatch):
+    monkeypatch.setattr(log_sync, "CACHE_DIR", str(tmp_path))
+    storage = SupabaseStorage(supabase)
+    new_log(storage, USER)
+    assert storage.all_logs(USER)[0]["categories"]["name"] == "Work"
+    assert log_sync.load_snapshot(USER) is not None
+
+    storage.update_category(1, {"name": "Deep Work"})
+
+    assert log_sync.load_snapshot(USER) is None
+    assert storage.all_logs(USER)[0]["categories"]["name"] == "Deep Work"
+
+def test_backend_must_implement_the_interface():
+    class Incomplete(Storage):
+        def list_categories(self):
+            return []
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_all_logs_waits_for_the_first_load(supabase, tmp_path, monkeypatch):
+    monkeypatch.setattr(log_sync, "CACHE_DIR", str(tmp_path))
+    storage = SupabaseStorage(supabase)
+    new_log(storage, USER)
+    snapshot = storage._get_snapshot(USER)
+
+    # Another thread is loading this user for the first time
+    result = []
+    with snapshot._lock:
+        reader = threading.Thread(target=lambda: result.append(storage.all_logs(USER)))
+        reader.start()
+        reader.join(0.2)
+        assert reader.is_alive()
+    reader.join(5)
+
+    assert len(result[0]) == 1
+
+def test_restart_serves_the_disk_copy_and_syncs_the_delta(supabase, tmp_path, monkeypatch):
+    monkeypatch.setattr(log_sync, "CACHE_DIR", str(tmp_path))
+    first = new_log(SupabaseStorage(supabase), USER)
+    SupabaseStorage(supabase).all_logs(USER)
+    added = new_log(SupabaseStorage(supabase), USER, date="2024-01-02")
+
+    started = []
+    class Thread(threading.Thread):
+        def start(self):
+            started.append(self)
+    monkeypatch.setattr(storage_module.threading, "Thread", Thread)
+
+    restarted = SupabaseStorage(supabase)
+    assert [log["id"] for log in restarted.all_logs(USER)] == [first["id"]]
+
+    # The background reconcile is a delta on top of the disk copy
+    supabase.calls.clear()
+    started[0].run()
+    assert supabase.calls == [("logs", "select"), ("log_tombstones", "select")]
+    assert [log["id"] for log in restarted.all_logs(USER)] == [added["id"], first["id"]]
@@ -0,0 +1,108 @@
+"""
+Tests for the write-ahead log queue
+"""
+
+import sqlite3
+
+import pytest
+
+import write_queue
+from write_queue import MAX_ATTEMPTS, WriteQueue, is_permanent_error
+
+class FlakyStorage:
+    """Records delivered rows; fails a user's inserts while they are listed in `down`"""
+
+    def __init__(self):
+        self.rows = []
+        self.down = {}  # user_id -> exception to raise
+
+    def insert_log(self, row):
+        error = self.down.get(row["user_id"])
+        if error is not None:
+            raise error
+        self.rows.append(row)
+        return row
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(write_queue.time, "time", clock)
+    return clock
+
+def log(user_id, note):
+    return {"user_id": user_id, "date": "2024-01-01", "hours": 1.0, "category_id": 1, "note": note}
+
+def test_delivers_each_users_entries_in_order(clock):
+    storage = FlakyStorage()
+    queue = WriteQueue(storage, ":memory:")
+    for note in ("a1", "b1", "a2", "b2"):
+        queue.enqueue(log(note[0], note))
+
+    assert queue.flush() == 4
+    assert [row["note"] for row in storage.rows if row["user_id"] == "a"] == ["a1", "a2"]
+    assert [row["note"] for row in storage.rows if row["user_id"] == "b"] == ["b1", "b2"]
+    assert queue.pending() == []
+
+def test_failing_user_does_not_block_others(clock):
+    storage = FlakyStorage()
+    storage.down["a"] = ConnectionError("offline")
+    queue = WriteQueue(storage, ":memory:")
+    for note in ("a1", "b1", "a2", "b2"):
+        queue.enqueue(log(note[0], note))
+
+    assert queue.flush() == 2
+    assert [row["note"] for row in storage.rows] == ["b1", "b2"]
+    assert [row["note"] for row in queue.pending("a")] == ["a1", "a2"]
+    assert queue.pending("a")[0]["last_error"] == "offline"
+
+    # Not retried before the backoff has passed, then delivered in order
+    del storage.down["a"]
+    assert queue.flush() == 0
+    clock.now += write_queue.RETRY_DELAY
+    assert queue.flush() == 2
+    assert [row["note"] for row in storage.rows] == ["b1", "b2", "a1", "a2"]
+
+def test_permanent_error_is_set_aside(clock):
+    storage = FlakyStorage()
+    storage.down["a"] = sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+    queue = WriteQueue(storage, ":memory:")
+    queue.enqueue(log("a", "a1"))
+    queue.enqueue(log("a", "a2"))
+
+    queue.flush()
+
+    assert queue.pending("a") == []
+    assert [row["note"] for row in queue.failed("a")] == ["a1", "a2"]
+    assert queue.discard_failed("a") == 2
+    assert queue.failed("a") == []
+
+def test_gives_up_after_max_attempts(clock):
+    storage = FlakyStorage()
+    storage.down["a"] = ConnectionError("offline")
+    queue = WriteQueue(storage, ":memory:")
+    queue.enqueue(log("a", "a1"))
+
+    for _ in range(MAX_ATTEMPTS):
+        queue.flush()
+        clock.now += write_queue.MAX_RETRY_DELAY
+
+    assert queue.pending("a") == []
+    assert queue.failed("a")[0]["attempts"] == MAX_ATTEMPTS
+
+def test_error_classification():
+    class APIError(Exception):
+        def __init__(self, code):
+            self.code = code
+
+    assert is_permanent_error(APIError("23505"))  # unique violation
+    assert is_permanent_error(APIError("42501"))  # row-level security
+    assert is_permanent_error(APIError("PGRST102"))
+    assert not is_permanent_error(APIError("PGRST301"))  # expired JWT
+    assert not is_permanent_error(ConnectionError("offline"))
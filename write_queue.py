@@ -0,0 +1,189 @@
+"""
+Write-ahead queue for Productivity Tracker
+New log entries are journaled to a local SQLite file first and pushed to the
+storage backend by a background thread, so logging never waits on the
+network and nothing is lost while the backend is unreachable
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+QUEUE_PATH = os.getenv(
+    "WRITE_QUEUE_PATH",
+    os.path.join(os.path.expanduser("~"), ".productivity-tracker", "write_queue.db")
+)
+
+RETRY_DELAY = 2.0  # seconds before the first retry; doubles on each failure
+MAX_RETRY_DELAY = 300.0
+MAX_ATTEMPTS = 12  # an entry still failing after this many tries is set aside
+
+# SQLSTATE classes no retry can fix: data exceptions (22), constraint
+# violations (23) and access rules, including RLS (42)
+PERMANENT_SQLSTATE_CLASSES = ("22", "23", "42")
+
+logger = logging.getLogger(__name__)
+
+def is_permanent_error(error: Exception) -> bool:
+    """Whether a failed delivery would fail the same way on every retry.
+
+    Expired sessions (PostgREST's PGRST3xx JWT errors, HTTP 401), timeouts
+    and rate limits count as transient.
+    """
+    if isinstance(error, (ValueError, sqlite3.IntegrityError)):
+        return True
+    code = str(getattr(error, "code", None) or "")
+    if code.startswith("PGRST"):
+        return code.startswith("PGRST1")
+    if len(code) == 5 and code[:2] in PERMANENT_SQLSTATE_CLASSES:
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in (401, 408, 429)
+
+class WriteQueue:
+    """Durable queue of log inserts, delivered in order with idempotency keys.
+
+    Every entry carries a client_id that the backend stores in a unique
+    column, so an entry delivered twice (e.g. the response was lost after
+    the insert committed) is only written once. Each user's entries are
+    delivered in the order they were logged; one user's failing entry does
+    not hold up anyone else's. Entries the backend rejects outright, or that
+    fail MAX_ATTEMPTS times, are marked dead and kept for the user to see.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pending_logs (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id TEXT NOT NULL UNIQUE,
+            user_id TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            queued_at TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            dead INTEGER NOT NULL DEFAULT 0
+        );
+    """
+
+    def __init__(self, storage, path: str = QUEUE_PATH, on_delivered=None):
+        self.storage = storage
+        self.on_delivered = on_delivered  # called with user_id after each delivery
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.executescript(self.SCHEMA)
+            # Journals written before dead letters existed
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(pending_logs)")}
+            if "dead" not in columns:
+                self._conn.execute("ALTER TABLE pending_logs ADD COLUMN dead INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_logs_user_seq ON pending_logs(user_id, dead, seq)")
+
+    def enqueue(self, row: dict) -> str:
+        """Journal a log row for delivery and return its client_id"""
+        row = dict(row)
+        row.setdefault("client_id", str(uuid.uuid4()))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO pending_logs (client_id, user_id, payload, queued_at) VALUES (?, ?, ?, ?)",
+                (row["client_id"], row["user_id"], json.dumps(row), datetime.now(timezone.utc).isoformat())
+            )
+        self._wakeup.set()
+        return row["client_id"]
+
+    def pending(self, user_id: str = None) -> list:
+        """Entries still being delivered, oldest first"""
+        return self._entries(0, user_id)
+
+    def failed(self, user_id: str = None) -> list:
+        """Dead entries that will not be retried, oldest first"""
+        return self._entries(1, user_id)
+
+    def discard_failed(self, user_id: str) -> int:
+        """Drop the user's dead entries; returns how many were dropped"""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM pending_logs WHERE user_id = ? AND dead = 1", (user_id,)).rowcount
+
+    def flush(self) -> int:
+        """Deliver every entry that is due; returns the number delivered.
+
+        Each round takes the oldest live entry of every user. A failure
+        stops delivery for that user only, so each user's entries still
+        reach the backend in the order they were logged.
+        """
+        delivered = 0
+        while True:
+            with self._lock:
+                heads = self._conn.execute("""
+                    SELECT * FROM pending_logs
+                    WHERE seq IN (SELECT MIN(seq) FROM pending_logs WHERE dead = 0 GROUP BY user_id)
+                      AND next_attempt <= ?
+                    ORDER BY seq
+                """, (time.time(),)).fetchall()
+            if not heads:
+                return delivered
+            for row in heads:
+                if self._deliver(row):
+                    delivered += 1
+
+    def _deliver(self, row) -> bool:
+        try:
+            self.storage.insert_log(json.loads(row["payload"]))
+        except Exception as e:
+            attempts = row["attempts"] + 1
+            if is_permanent_error(e) or attempts >= MAX_ATTEMPTS:
+                logger.warning("Giving up on queued log %s after %d attempt(s): %s", row["client_id"], attempts, e)
+                dead, next_attempt = 1, 0
+            else:
+                dead, next_attempt = 0, time.time() + min(RETRY_DELAY * 2 ** row["attempts"], MAX_RETRY_DELAY)
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE pending_logs SET attempts = ?, next_attempt = ?, last_error = ?, dead = ? WHERE seq = ?",
+                    (attempts, next_attempt, str(e), dead, row["seq"])
+                )
+            return False
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pending_logs WHERE seq = ?", (row["seq"],))
+        if self.on_delivered:
+            self.on_delivered(row["user_id"])
+        return True
+
+    def _entries(self, dead: int, user_id: str = None) -> list:
+        sql = "SELECT * FROM pending_logs WHERE dead = ?"
+        params = (dead,)
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params += (user_id,)
+        with self._lock:
+            rows = self._conn.execute(f"{sql} ORDER BY seq", params).fetchall()
+        return [dict(json.loads(row["payload"]), attempts=row["attempts"], last_error=row["last_error"]) for row in rows]
+
+    def start(self):
+        """Start the background delivery thread (once)"""
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="write-queue", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            # Cleared before flushing so an entry queued meanwhile wakes us again
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write queue error")
+            with self._lock:
+                row = self._conn.execute("SELECT MIN(next_attempt) FROM pending_logs WHERE dead = 0").fetchone()
+            timeout = None if row[0] is None else max(row[0] - time.time(), 0.1)
+            self._wakeup.wait(timeout)